@@ -1,4 +1,5 @@
-from .runner import Runner, PatchedStdinRunner, PatchedSleepRunner, PyodideRunner
+from .runner import Runner, PatchedStdinRunner, PatchedSleepRunner, PyodideRunner, AsyncPyodideRunner, CodeCache
+from .budget import ExecutionBudget, BudgetExceeded
 
 try:
     from .version import __version__
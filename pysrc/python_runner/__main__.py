@@ -0,0 +1,163 @@
+"""
+Runs a .py or .spy (Strype project) file headlessly with python_runner,
+writing each output part to stdout as a line of JSON, e.g.:
+
+    python -m python_runner my_program.spy --input answers.txt --virtual-time --timeout 10
+
+Input is read from stdin unless --input is given.
+The last line is a part with type 'exit' summarising the run,
+and the exit code is 0 if the program ran without errors.
+
+.spy files run with the names from strype.builtins, as in Strype, but without the browser:
+clear_console() does nothing, get_connected_cloud() returns None, and importing
+strype.graphics, strype.sound or turtle fails with an ImportError saying so.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from time import perf_counter
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict, List, Optional, TextIO
+
+from . import runner as runner_module
+from .budget import BudgetExceeded, ExecutionBudget, _skip_frames
+from .runner import PatchedSleepRunner, PatchedStdinRunner
+
+# PatchedSleepRunner replaces time.sleep, so keep the original
+real_sleep = time.sleep
+
+
+class StrypeBridgeStub(ModuleType):
+    """
+    Stands in for the `strype_bridge` module which Strype provides from JavaScript,
+    with just enough for strype.builtins. The other parts need a browser.
+    """
+
+    def __init__(self):
+        super().__init__("strype_bridge")
+        self.strype_graphics_input_internal = SimpleNamespace(
+            clearConsole=lambda: None,
+            getCurrentCloudName=lambda: None,
+        )
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        raise ImportError(
+            f"strype_bridge.{name} is only available in Strype in the browser, "
+            "so programs using strype.graphics, strype.sound or turtle can't run from the command line"
+        )
+
+
+class CLIRunner(PatchedStdinRunner, PatchedSleepRunner):
+    def __init__(self, out: TextIO, stdin: Optional[TextIO], virtual_time: bool, strype: bool = False, **kwargs):
+        self.out = out
+        # None once the input is only from an --input file
+        self.stdin = stdin
+        # Whether to provide the names from strype.builtins, for .spy files
+        self.strype = strype
+        # See PatchedSleepRunner: with a virtual clock, sleeping doesn't call back
+        self.virtual_time = virtual_time
+        self.slept = 0.0
+        self.error_type: Optional[str] = None
+        super().__init__(callback=self.handle_event, **kwargs)
+
+    def handle_event(self, event_type: str, data: Dict[str, Any]):
+        if event_type == "output":
+            self.write_parts(data["parts"])
+        elif event_type == "input":
+            line = self.stdin.readline() if self.stdin else ""
+            if not line:
+                raise EOFError("EOF when reading a line")
+            return line
+        elif event_type == "sleep":
+            self.slept += data["seconds"]
+            real_sleep(data["seconds"])
+
+    def write_parts(self, parts: List[Dict[str, Any]]):
+        for part in parts:
+            self.out.write(json.dumps(part) + "\n")
+        self.out.flush()
+
+    def reset(self):
+        super().reset()
+        if self.strype:
+            # Like StrypePyodideRunner: from strype.builtins import *
+            import strype.builtins
+            for name in getattr(strype.builtins, "__all__", dir(strype.builtins)):
+                if not name.startswith("_"):
+                    self.console.locals[name] = getattr(strype.builtins, name)
+
+    def serialize_traceback(self, exc: BaseException) -> dict:
+        # Hide the frames of reading input and handling the callback, e.g. for an EOFError
+        for internal_file in (runner_module.__file__, __file__):
+            exc.__traceback__ = _skip_frames(exc.__traceback__, internal_file)
+        self.error_type = type(exc).__name__
+        if isinstance(exc, SystemExit) and exc.code in (None, 0):
+            self.error_type = None
+        return dict(super().serialize_traceback(exc), error_type=type(exc).__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m python_runner",
+        description="Run a .py or .spy file with python_runner, writing output parts as JSON lines.",
+    )
+    parser.add_argument("file", help="the .py or .spy file to run")
+    parser.add_argument("--input", metavar="FILE", help="read input() lines from this file instead of stdin")
+    parser.add_argument(
+        "--virtual-time",
+        action="store_true",
+        help="make sleep() return immediately, advancing a simulated clock for time.time() etc.",
+    )
+    parser.add_argument("--timeout", type=float, metavar="SECONDS", help="stop the program after this long")
+    args = parser.parse_args(argv)
+
+    with open(args.file, encoding="utf8") as f:
+        source_code = f.read()
+
+    # Like `python file.py`, allow importing modules next to the file
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.file)))
+    strype = args.file.endswith(".spy")
+    if strype:
+        sys.modules.setdefault("strype_bridge", StrypeBridgeStub())
+    input_file = open(args.input, encoding="utf8") if args.input else None
+    runner = CLIRunner(
+        out=sys.stdout,
+        stdin=None if input_file else sys.stdin,
+        virtual_time=args.virtual_time,
+        strype=strype,
+        filename=args.file,
+    )
+    if input_file:
+        runner.set_input_script(input_file)
+
+    start = perf_counter()
+    try:
+        runner.run(source_code, budget=ExecutionBudget(time_limit=args.timeout) if args.timeout else None)
+    finally:
+        if input_file:
+            input_file.close()
+
+    status = "ok"
+    if runner.error_type == BudgetExceeded.__name__:
+        status = "timeout"
+    elif runner.error_type == "SyntaxError":
+        status = "syntax_error"
+    elif runner.error_type:
+        status = "error"
+    runner.write_parts([dict(
+        type="exit",
+        text="",
+        status=status,
+        time=perf_counter() - start,
+        slept=runner.clock.slept if runner.clock else runner.slept,
+    )])
+    return 0 if status == "ok" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
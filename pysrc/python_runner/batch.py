@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+from multiprocessing.connection import Connection, wait
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from . import runner as runner_module
+from .budget import BudgetExceeded, ExecutionBudget, _skip_frames
+from .runner import PatchedSleepRunner, PatchedStdinRunner
+
+# Extra seconds a program with an ExecutionBudget gets beyond its timeout to stop by itself
+# before its process is killed
+KILL_GRACE = 1.0
+
+Inputs = Union[str, Iterable[str]]
+
+
+class BatchRunner(PatchedStdinRunner, PatchedSleepRunner):
+    """
+    Runner used by `run_many` which handles its own callbacks:
+    output is collected, stdin is read from the input script (EOFError when it runs out),
+    and sleeping only advances the virtual `clock` instead of waiting.
+    """
+
+    virtual_time = True
+
+    def __init__(self, inputs: Inputs = (), **kwargs):
+        self.parts: List[Dict[str, Any]] = []
+        super().__init__(callback=self.handle_event, **kwargs)
+        self.set_input_script(inputs)
+
+    def handle_event(self, event_type: str, data: Dict[str, Any]):
+        if event_type == "output":
+            self.parts.extend(data["parts"])
+        elif event_type == "input":
+            raise EOFError("EOF when reading a line")
+
+    def serialize_traceback(self, exc: BaseException) -> dict:
+        # Hide the frames of reading input and handling the callback,
+        # e.g. for the EOFError raised when the program runs out of inputs
+        for internal_file in (runner_module.__file__, __file__):
+            exc.__traceback__ = _skip_frames(exc.__traceback__, internal_file)
+        result = super().serialize_traceback(exc)
+        result["error_type"] = type(exc).__name__
+        if isinstance(exc, SystemExit):
+            result["exit_code"] = exc.code
+        return result
+
+
+def run_one(
+    source_code: str,
+    inputs: Inputs = (),
+    budget: Optional[ExecutionBudget] = None,
+    filename: str = "my_program.py",
+) -> dict:
+    """
+    Runs one program in this process with a BatchRunner and returns a result dict like `run_many`.
+    """
+    start = perf_counter()
+    runner = BatchRunner(inputs=inputs, filename=filename)
+    runner.run(source_code, budget=budget)
+
+    status, exit_code, error = "ok", 0, None
+    for part in runner.parts:
+        if part["type"] == "syntax_error":
+            status, exit_code, error = "syntax_error", 1, part["text"]
+        elif part["type"] == "traceback":
+            error = part["text"]
+            if part.get("error_type") == BudgetExceeded.__name__:
+                status, exit_code = "timeout", 1
+            elif part.get("error_type") == "SystemExit":
+                code = part.get("exit_code")
+                if code in (None, 0):
+                    error = None
+                else:
+                    # Like the interpreter, other exit codes (e.g. a message) exit with 1
+                    status, exit_code = "error", code if isinstance(code, int) else 1
+            else:
+                status, exit_code = "error", 1
+
+    return dict(
+        status=status,
+        exit_code=exit_code,
+        parts=runner.parts,
+        stdout="".join(p["text"] for p in runner.parts if p["type"] == "stdout"),
+        stderr="".join(p["text"] for p in runner.parts if p["type"] == "stderr"),
+        traceback=error,
+        time=perf_counter() - start,
+        virtual_time=runner.clock.slept if runner.clock else 0.0,
+    )
+
+
+def _run_in_process(conn: Connection, *args):
+    try:
+        conn.send(run_one(*args))
+    finally:
+        conn.close()
+
+
+def run_many(
+    sources: Sequence[str],
+    inputs: Optional[Sequence[Inputs]] = None,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = 10.0,
+    filename: str = "my_program.py",
+    budget: Optional[ExecutionBudget] = None,
+) -> List[dict]:
+    """
+    Runs many programs in parallel, e.g. to grade student submissions,
+    and returns a list of result dicts in the same order as `sources`.
+
+    Each program runs in a fresh process (at most `workers` at a time, by default one per CPU)
+    with its own `__main__` module, reading stdin from the corresponding item of `inputs`
+    (a string or list of lines) and sleeping in virtual time.
+    A program that runs for more than `timeout` seconds has its process killed,
+    and one which crashes or hangs its process doesn't affect the others.
+    Programs run at full speed, without the overhead of an ExecutionBudget, unless `budget` is given.
+    A budget (e.g. with a `time_limit` shorter than `timeout`) lets a program be stopped within its process,
+    keeping its output and giving a traceback, and then its process is only killed
+    if it's still running `KILL_GRACE` seconds after `timeout`.
+
+    Each result dict has the keys:
+    - status: 'ok', 'error', 'syntax_error', 'timeout' or 'crashed'
+    - exit_code: 0 for 'ok', the code passed to sys.exit, the exit code of a crashed process, or otherwise 1
+    - parts: the list of output parts, as in the 'output' callback event
+    - stdout, stderr: the concatenated text of those parts
+    - traceback: the text of the error, if any
+    - time: the real time taken, in seconds
+    - virtual_time: the total number of seconds the program slept
+    """
+    workers = workers or os.cpu_count() or 1
+    inputs = inputs if inputs is not None else [()] * len(sources)
+    if len(inputs) != len(sources):
+        raise ValueError("inputs must have one item for each source")
+
+    context = multiprocessing.get_context()
+    results: List[Optional[dict]] = [None] * len(sources)
+    pending = list(range(len(sources)))
+    pending.reverse()
+    # Connection -> (index, process, start time)
+    running: Dict[Connection, Any] = {}
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index = pending.pop()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_run_in_process,
+                args=(sender, sources[index], inputs[index], budget, filename),
+                daemon=True,
+            )
+            process.start()
+            sender.close()
+            running[receiver] = (index, process, perf_counter())
+
+        for conn in wait(list(running), timeout=0.1):
+            index, process, start = running.pop(conn)
+            try:
+                results[index] = conn.recv()
+            except EOFError:
+                process.join()
+                results[index] = _failed("crashed", process.exitcode, perf_counter() - start)
+            conn.close()
+            process.join()
+
+        if timeout is not None:
+            now = perf_counter()
+            for conn, (index, process, start) in list(running.items()):
+                if now - start > timeout + (KILL_GRACE if budget else 0):
+                    process.kill()
+                    process.join()
+                    conn.close()
+                    del running[conn]
+                    results[index] = _failed("timeout", 1, now - start)
+
+    return results  # type: ignore
+
+
+def _failed(status: str, exit_code: Optional[int], elapsed: float) -> dict:
+    return dict(
+        status=status,
+        exit_code=exit_code,
+        parts=[],
+        stdout="",
+        stderr="",
+        traceback=None,
+        time=elapsed,
+        virtual_time=0.0,
+    )
@@ -0,0 +1,251 @@
+import dis
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+from types import CodeType, FrameType, TracebackType
+from typing import Dict, Optional, Set
+
+from .monitoring import MONITORING, monitoring_tool
+
+# sys.monitoring tool ID, distinct from the IDs used by the run modes (e.g. PROFILER_ID)
+BUDGET_TOOL_ID = 4
+
+JUMP_OPCODES = frozenset(dis.hasjrel + dis.hasjabs)
+
+# Before Python 3.12, jumping back to the same line (e.g. in `while True: pass`) doesn't cause a line event
+ONE_LINE_LOOPS_TRACE_LINES = sys.version_info >= (3, 12)
+
+
+class BudgetExceeded(RuntimeError):
+    """
+    Raised in user code which has run out of its ExecutionBudget.
+    """
+
+
+class ExecutionBudget:
+    """
+    Limits how much user code can run, to stop runaway programs such as `while True: pass`
+    which never call back (e.g. to sleep) and so can't otherwise be interrupted.
+
+    `max_steps` limits the number of steps in the user's file, where a step is a function call
+    or an iteration of a loop, and `time_limit` limits the wall-clock time in seconds.
+    When either is exhausted, BudgetExceeded is raised in the user's code,
+    and raised again at each following step so that the code can't carry on by catching it.
+    The clock is checked about every `check_period` seconds, however long each step takes.
+    Only Python code can be interrupted: a long call into C code, e.g. `sum(range(10 ** 9))`,
+    runs to completion before the budget is checked again.
+
+    Pass an instance as the `budget` argument of `Runner.run` or `Runner.run_async`.
+    With sys.monitoring, only function calls and jumps backwards within the user's code are monitored,
+    so the overhead is small. On Python versions without sys.monitoring this uses line tracing with sys.settrace
+    (tracing each instruction only in code with a loop on one line), which is much slower. It also means the budget isn't enforced in modes which install their own
+    trace function (e.g. 'snoop'). There, CPython also stops tracing when BudgetExceeded is raised,
+    and tracing only restarts at the next function call or return, so a loop which catches
+    BaseException (e.g. with a bare `except:`) and calls nothing can't be stopped.
+    """
+
+    # Roughly how often to check the clock, in seconds
+    check_period = 0.01
+    # The most steps between checks of the clock
+    max_check_interval = 10_000
+
+    def __init__(self, max_steps: Optional[int] = None, time_limit: Optional[float] = None):
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.steps = 0
+        self.deadline: Optional[float] = None
+        self.exceeded: Optional[BudgetExceeded] = None
+        self._next_check = 0
+        self._check_interval = 1
+        self._last_check = (0, 0.0)
+
+    def step(self):
+        self.steps += 1
+        if self.steps >= self._next_check:
+            self.check()
+
+    def check(self):
+        if not self.exceeded:
+            if self.max_steps is not None and self.steps > self.max_steps:
+                self.exceeded = BudgetExceeded(f"Program ran more than {self.max_steps} steps of code")
+            elif self.deadline is not None:
+                now = perf_counter()
+                if now > self.deadline:
+                    self.exceeded = BudgetExceeded(f"Program ran for longer than {self.time_limit} seconds")
+                else:
+                    self._adapt_interval(now)
+            else:
+                self._check_interval = self.max_check_interval
+        if self.exceeded:
+            self._next_check = self.steps
+            raise self.exceeded
+
+        self._next_check = self.steps + self._check_interval
+        if self.max_steps is not None:
+            self._next_check = min(self._next_check, self.max_steps + 1)
+
+    def _adapt_interval(self, now: float):
+        """
+        Chooses how many steps to take before checking the clock again,
+        from how fast the steps since the last check were, so that the next check is
+        about `check_period` seconds (or the time left until the deadline) from now.
+        The interval at most doubles each time, in case the steps become slower.
+        """
+        last_steps, last_time = self._last_check
+        self._last_check = (self.steps, now)
+        period = min(self.check_period, self.deadline - now)  # type: ignore
+        if now > last_time:
+            interval = int((self.steps - last_steps) * period / (now - last_time))
+        else:
+            interval = self._check_interval * 2
+        self._check_interval = max(1, min(interval, self._check_interval * 2, self.max_check_interval))
+
+    @contextmanager
+    def enforce(self, filename: str):
+        """
+        Context manager which enforces this budget on code from `filename` run inside it.
+        """
+        self.steps = 0
+        self.exceeded = None
+        self._next_check = 0
+        self._check_interval = 1
+        self._last_check = (0, perf_counter())
+        if self.time_limit is not None:
+            self.deadline = perf_counter() + self.time_limit
+
+        try:
+            if MONITORING:
+                with self._monitor(filename):
+                    yield
+            else:
+                with self._trace(filename):
+                    yield
+        except BudgetExceeded as e:
+            if e is self.exceeded:
+                e.__traceback__ = _skip_frames(e.__traceback__, __file__)
+            raise
+
+    @contextmanager
+    def _monitor(self, filename: str):
+        mon = sys.monitoring  # type: ignore
+        # User code objects with local JUMP events enabled
+        codes: Set[CodeType] = set()
+
+        def start(code: CodeType, _offset: int):
+            if code.co_filename != filename:
+                # Only user code is counted, so stop monitoring calls of this code
+                return mon.DISABLE
+            if code not in codes:
+                # Found here rather than from the code being run, so that code defined
+                # in previous runs (e.g. in 'incremental' mode) is also counted
+                codes.add(code)
+                mon.set_local_events(BUDGET_TOOL_ID, code, mon.events.JUMP)
+            self.step()
+
+        def jump(_code: CodeType, offset: int, destination: int):
+            if destination > offset:
+                return mon.DISABLE
+            # A loop iteration, counted inline since this is called the most
+            self.steps += 1
+            if self.steps >= self._next_check:
+                self.check()
+
+        with monitoring_tool(
+            BUDGET_TOOL_ID,
+            "python_runner budget",
+            {mon.events.PY_START: start, mon.events.JUMP: jump},
+            global_events=mon.events.PY_START,
+        ):
+            try:
+                yield
+            finally:
+                for code in codes:
+                    mon.set_local_events(BUDGET_TOOL_ID, code, 0)
+
+    @contextmanager
+    def _trace(self, filename: str):
+        # The last line (or instruction offset, when tracing opcodes) seen in each frame,
+        # to count going back to the same or an earlier position as a loop iteration
+        last_positions: Dict[FrameType, int] = {}
+        one_line_loops: Dict[CodeType, bool] = {}
+        old_trace = sys.gettrace()
+        old_profile = sys.getprofile()
+
+        def global_trace(frame, _event, _arg):
+            code = frame.f_code
+            if code.co_filename != filename:
+                return None
+            if not ONE_LINE_LOOPS_TRACE_LINES:
+                if code not in one_line_loops:
+                    one_line_loops[code] = _has_one_line_loop(code)
+                # Loops within one line (e.g. `while True: pass`) don't cause line events,
+                # so only code with such loops pays for tracing each instruction
+                frame.f_trace_opcodes = one_line_loops[code]
+            last_positions[frame] = -1
+            counted_step()
+            return local_trace
+
+        def local_trace(frame, event, _arg):
+            if event == "return":
+                last_positions.pop(frame, None)
+            elif event == ("opcode" if frame.f_trace_opcodes else "line"):
+                position = frame.f_lasti if event == "opcode" else frame.f_lineno
+                if self.exceeded or position <= last_positions.get(frame, -1):
+                    counted_step()
+                last_positions[frame] = position
+            return local_trace
+
+        def counted_step():
+            try:
+                self.step()
+            except BudgetExceeded:
+                # Raising turns off tracing, so start it again at the next call or return
+                sys.setprofile(restart)
+                raise
+
+        def restart(frame, _event, _arg):
+            sys.setprofile(old_profile)
+            sys.settrace(global_trace)
+            while frame:
+                if frame.f_code.co_filename == filename:
+                    frame.f_trace = local_trace
+                frame = frame.f_back
+
+        sys.settrace(global_trace)
+        try:
+            yield
+        finally:
+            sys.settrace(old_trace)
+            sys.setprofile(old_profile)
+
+
+def _has_one_line_loop(code: CodeType) -> bool:
+    """
+    Returns True if the code has a jump backwards to an instruction on the same line.
+    """
+    lines = {}
+    line = None
+    for instruction in dis.get_instructions(code):
+        if instruction.starts_line is not None:
+            line = instruction.starts_line
+        lines[instruction.offset] = line
+    return any(
+        instruction.opcode in JUMP_OPCODES
+        and instruction.argval <= instruction.offset
+        and lines.get(instruction.argval) == lines[instruction.offset]
+        for instruction in dis.get_instructions(code)
+    )
+
+
+def _skip_frames(tb: Optional[TracebackType], filename: str) -> Optional[TracebackType]:
+    """
+    Returns the traceback without the entries for frames in the given file.
+    """
+    entries = []
+    while tb:
+        if tb.tb_frame.f_code.co_filename != filename:
+            entries.append(tb)
+        tb = tb.tb_next
+    for entry, entry_next in zip(entries, entries[1:] + [None]):
+        entry.tb_next = entry_next
+    return entries[0] if entries else None
@@ -0,0 +1,64 @@
+import time
+
+# The real functions, since VirtualClock.install replaces them in the time module
+real_time = time.time
+real_monotonic = time.monotonic
+real_perf_counter = time.perf_counter
+
+
+class VirtualClock:
+    """
+    Simulated clock for time.time, time.monotonic and time.perf_counter,
+    where sleeping advances the clock instantly instead of waiting.
+
+    The clock starts at the real time. If `follow_real_time` is True (the default),
+    it also advances with the real time spent running, so code which measures how long it took
+    (e.g. strype.graphics.pace() accounting for the time of each frame) sees the same as with a real clock,
+    just without the waiting. Otherwise only sleeping advances the clock, making runs deterministic,
+    but then anything waiting for the real clock to pass a time (e.g. asyncio timers) will hang.
+
+    Only code which looks up the functions in the time module when calling them
+    (e.g. `time.time()`, not `from time import time`) sees the virtual clock.
+    """
+
+    def __init__(self, follow_real_time: bool = True):
+        self.follow_real_time = follow_real_time
+        self.slept = 0.0
+        self._start_time = real_time()
+        self._start_monotonic = real_monotonic()
+        self._start_perf_counter = real_perf_counter()
+
+    def elapsed(self) -> float:
+        """
+        The number of virtual seconds since the clock was created.
+        """
+        elapsed = self.slept
+        if self.follow_real_time:
+            elapsed += real_perf_counter() - self._start_perf_counter
+        return elapsed
+
+    def sleep(self, seconds: float):
+        self.slept += seconds
+
+    def time(self) -> float:
+        return self._start_time + self.elapsed()
+
+    def monotonic(self) -> float:
+        return self._start_monotonic + self.elapsed()
+
+    def perf_counter(self) -> float:
+        return self._start_perf_counter + self.elapsed()
+
+    def install(self):
+        """
+        Replaces the functions in the time module with this clock, except time.sleep.
+        """
+        time.time = self.time
+        time.monotonic = self.monotonic
+        time.perf_counter = self.perf_counter
+
+    @staticmethod
+    def uninstall():
+        time.time = real_time
+        time.monotonic = real_monotonic
+        time.perf_counter = real_perf_counter
@@ -0,0 +1,101 @@
+import dis
+import sys
+from contextlib import contextmanager
+from types import CodeType
+from typing import Dict, Set
+
+from .monitoring import MONITORING, code_objects, execute_within, monitoring_tool
+
+TYPING = False
+if TYPING:
+    from .runner import Runner
+
+
+class LineCoverage:
+    """
+    The set of lines of the user's code which ran, out of all the lines with code.
+    Each line only costs anything the first time it runs, so this is cheap enough
+    to leave on for long running code such as game loops.
+    """
+
+    def __init__(self, code_obj: CodeType):
+        self.code_lines: Dict[CodeType, Set[int]] = {
+            code: {lineno for _, lineno in dis.findlinestarts(code) if lineno}
+            for code in code_objects(code_obj)
+        }
+        self.lines: Set[int] = set()
+
+    @contextmanager
+    def monitor(self):
+        """
+        Records lines using sys.monitoring, disabling the event for each line after it first runs.
+        """
+        mon = sys.monitoring  # type: ignore
+
+        def line(_code, lineno):
+            self.lines.add(lineno)
+            return mon.DISABLE
+
+        with monitoring_tool(
+            mon.COVERAGE_ID,
+            "python_runner coverage",
+            {mon.events.LINE: line},
+            codes=self.code_lines,
+            local_events=mon.events.LINE,
+        ):
+            yield
+
+    @contextmanager
+    def trace(self):
+        """
+        Records lines using sys.settrace, for Python versions without sys.monitoring.
+        Frames of code whose lines have all run already aren't traced.
+        """
+        # The lines of each code object which haven't run yet
+        remaining = {code: set(lines) for code, lines in self.code_lines.items()}
+
+        def global_trace(frame, _event, _arg):
+            if remaining.get(frame.f_code):
+                return local_trace
+            return None
+
+        def local_trace(frame, event, _arg):
+            if event == "line":
+                lines = remaining[frame.f_code]
+                lines.discard(frame.f_lineno)
+                self.lines.add(frame.f_lineno)
+                if not lines:
+                    return None
+            return local_trace
+
+        old_trace = sys.gettrace()
+        sys.settrace(global_trace)
+        try:
+            yield
+        finally:
+            sys.settrace(old_trace)
+
+    def serialize(self) -> dict:
+        """
+        Returns the data for the 'coverage' output part, with the sorted line numbers
+        which ran (`lines`) and which didn't (`missed`).
+        """
+        all_lines = set().union(*self.code_lines.values())
+        lines = sorted(self.lines & all_lines)
+        missed = sorted(all_lines - self.lines)
+        text = f"Coverage: {len(lines)} of {len(all_lines)} lines ran\n"
+        return dict(text=text, lines=lines, missed=missed)
+
+
+def exec_coverage(runner: 'Runner', code_obj: CodeType):
+    coverage = LineCoverage(code_obj)
+
+    @contextmanager
+    def covering():
+        try:
+            with coverage.monitor() if MONITORING else coverage.trace():
+                yield
+        finally:
+            runner.output("coverage", **coverage.serialize())
+
+    return execute_within(runner, code_obj, covering())
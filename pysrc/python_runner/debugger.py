@@ -0,0 +1,164 @@
+import reprlib
+import sys
+from contextlib import contextmanager
+from types import CodeType, FrameType
+from typing import Any, Dict, Iterable, List
+
+from .monitoring import MONITORING, code_objects, execute_within, monitoring_tool
+
+TYPING = False
+if TYPING:
+    from .runner import Runner
+
+
+class Debugger:
+    """
+    Pauses the user's code at the given breakpoints (line numbers in the user's file)
+    by calling back with a 'debug_pause' event, whose data has:
+    - lineno, function: where the code is paused
+    - variables: reprs of the variables in the current frame
+    - stack: a list of dicts with `function` and `lineno` for each frame of user code, outermost first
+    - evaluation: the result of the last 'evaluate' command, if any,
+      with `expression` and either `value` (a repr) or `error`
+
+    The callback should return one of these commands:
+    - 'continue': run until the next breakpoint
+    - 'step': run until the next line of user code
+    - {'command': 'evaluate', 'expression': ...}: evaluate the expression in the current frame,
+      then call back again with the result
+
+    With sys.monitoring, line events are only enabled in code objects with breakpoints,
+    and each other line is disabled the first time it runs, so code away from breakpoints
+    runs at nearly full speed. Stepping enables line events everywhere until the next 'continue'.
+    """
+
+    repr = reprlib.Repr()
+    repr.maxstring = 100
+    repr.maxother = 100
+
+    def __init__(self, runner: 'Runner', code_obj: CodeType, breakpoints: Iterable[int]):
+        self.runner = runner
+        self.breakpoints = set(breakpoints)
+        self.codes = list(code_objects(code_obj))
+        self.breakpoint_codes = [
+            code for code in self.codes
+            if any(lineno in self.breakpoints for _, _, lineno in code.co_lines())
+        ]
+        self.stepping = False
+
+    def stop(self, frame: FrameType):
+        """
+        Pauses at the current line of the frame until the callback says to carry on.
+        """
+        evaluation = None
+        while True:
+            data: Dict[str, Any] = dict(
+                lineno=frame.f_lineno,
+                function=frame.f_code.co_name,
+                variables=self.variables(frame),
+                stack=self.stack(frame),
+            )
+            if evaluation:
+                data["evaluation"] = evaluation
+            response = self.runner.callback("debug_pause", **data)
+            if hasattr(response, "to_py"):
+                response = response.to_py()
+            command = response.get("command") if isinstance(response, dict) else response
+
+            if command == "evaluate":
+                evaluation = self.evaluate(frame, response.get("expression", ""))
+            elif command in ("step", "continue"):
+                self.set_stepping(command == "step", frame)
+                return
+            else:
+                raise ValueError(f"Unknown debug command {command!r}, expected 'step', 'continue' or 'evaluate'")
+
+    def set_stepping(self, stepping: bool, frame: FrameType):
+        if stepping == self.stepping:
+            return
+        self.stepping = stepping
+        if MONITORING:
+            mon = sys.monitoring  # type: ignore
+            for code in self.codes:
+                enabled = stepping or code in self.breakpoint_codes
+                mon.set_local_events(mon.DEBUGGER_ID, code, mon.events.LINE if enabled else 0)
+            if stepping:
+                # Lines without breakpoints were disabled when they first ran
+                mon.restart_events()
+        elif stepping:
+            # Frames without breakpoints aren't being traced, so make them stop in the next line too
+            while frame:
+                if frame.f_code.co_filename == self.runner.filename:
+                    frame.f_trace = self._local_trace
+                frame = frame.f_back  # type: ignore
+
+    def evaluate(self, frame: FrameType, expression: str) -> Dict[str, str]:
+        try:
+            value = eval(expression, frame.f_globals, frame.f_locals)
+        except Exception as e:
+            return dict(expression=expression, error=f"{type(e).__name__}: {e}")
+        return dict(expression=expression, value=self.repr.repr(value))
+
+    def variables(self, frame: FrameType) -> Dict[str, str]:
+        names: Iterable[str] = frame.f_locals
+        if frame.f_locals is frame.f_globals:
+            # At module level, only show the names used by the code rather than all the globals
+            names = frame.f_code.co_names
+        return {
+            name: self.repr.repr(frame.f_locals[name])
+            for name in names
+            if name in frame.f_locals and not name.startswith("__")
+        }
+
+    def stack(self, frame: FrameType) -> List[Dict[str, Any]]:
+        result = []
+        while frame and frame.f_code.co_filename == self.runner.filename:
+            result.append(dict(function=frame.f_code.co_name, lineno=frame.f_lineno))
+            frame = frame.f_back  # type: ignore
+        result.reverse()
+        return result
+
+    @contextmanager
+    def monitor(self):
+        mon = sys.monitoring  # type: ignore
+
+        def line(_code, lineno):
+            if not (self.stepping or lineno in self.breakpoints):
+                return mon.DISABLE
+            self.stop(sys._getframe(1))
+
+        with monitoring_tool(mon.DEBUGGER_ID, "python_runner debugger", {mon.events.LINE: line}, codes=self.codes):
+            for code in self.breakpoint_codes:
+                mon.set_local_events(mon.DEBUGGER_ID, code, mon.events.LINE)
+            yield
+
+    @contextmanager
+    def trace(self):
+        """
+        Uses sys.settrace for Python versions without sys.monitoring,
+        only tracing the lines of frames with breakpoints unless stepping.
+        """
+        codes = set(self.codes)
+        breakpoint_codes = set(self.breakpoint_codes)
+
+        def global_trace(frame, _event, _arg):
+            if frame.f_code in codes and (self.stepping or frame.f_code in breakpoint_codes):
+                return self._local_trace
+            return None
+
+        old_trace = sys.gettrace()
+        sys.settrace(global_trace)
+        try:
+            yield
+        finally:
+            sys.settrace(old_trace)
+
+    def _local_trace(self, frame, event, _arg):
+        if event == "line" and (self.stepping or frame.f_lineno in self.breakpoints):
+            self.stop(frame)
+        return self._local_trace
+
+
+def exec_debug(runner: 'Runner', code_obj: CodeType):
+    debugger = Debugger(runner, code_obj, runner.breakpoints)
+    return execute_within(runner, code_obj, debugger.monitor() if MONITORING else debugger.trace())
@@ -0,0 +1,289 @@
+import ast
+from collections import defaultdict
+from collections.abc import Awaitable
+from difflib import SequenceMatcher
+from types import CodeType, TracebackType
+from typing import Dict, List, Optional, Set
+
+TYPING = False
+if TYPING:
+    from .runner import Runner
+
+# Nodes whose bodies have their own scope, so assignments inside them don't bind module names
+_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+# Builtins which don't change their arguments, unless the user's code defines a name of its own like them.
+# Functions which consume iterators (e.g. sum or list) aren't included.
+_PURE_BUILTINS = frozenset({
+    "print", "len", "str", "repr", "int", "float", "bool", "abs", "round",
+    "isinstance", "type", "id", "hash", "format", "chr", "ord", "range",
+})
+
+
+class Statement:
+    """
+    A top-level statement of the user's code and the module names it uses.
+    """
+
+    def __init__(self, node: ast.stmt):
+        self.node = node
+        self.key = ast.dump(node)
+        self.lineno = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", ())])
+        self.end_lineno = node.end_lineno or node.lineno
+        # Functions and classes keep line numbers in their code objects,
+        # so they need redefining when they move, e.g. for tracebacks to be correct
+        self.has_code = any(isinstance(n, _SCOPES) for n in ast.walk(node))
+        self.completed = False
+        self.defines: Set[str] = set()
+        self.reads: Set[str] = set()
+        # Names whose values are changed in place, e.g. `a.x = 1`, `d[k] = v` or `del d[k]`
+        self.mutates: Set[str] = set()
+        # Names whose methods are called, e.g. `data.append(x)`, which may also change them in place
+        self.method_calls: Set[str] = set()
+        # Names passed as arguments, e.g. `random.shuffle(deck)` or `setattr(obj, ...)`, which may also
+        # change them in place, keyed by the name of the function called (None if it isn't a plain name)
+        self.call_args: Dict[Optional[str], Set[str]] = defaultdict(set)
+        # Names declared `global` or changed in place inside functions defined by this statement
+        self.global_writes: Set[str] = set()
+        self.global_method_calls: Set[str] = set()
+        self.global_call_args: Dict[Optional[str], Set[str]] = defaultdict(set)
+        self._visit(node, top=True)
+
+    def _visit(self, node: ast.AST, top: bool):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                self.reads.add(node.id)
+            elif top:
+                self.defines.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                name = alias.asname or alias.name.split(".")[0]
+                self.defines.add(name)  # '*' for star imports, which means 'unknown'
+        elif isinstance(node, ast.Global):
+            self.global_writes.update(node.names)
+        elif isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)):
+            if node.name and top:
+                self.defines.add(node.name)
+        elif isinstance(node, ast.MatchMapping):
+            if node.rest and top:
+                self.defines.add(node.rest)
+        elif isinstance(node, (ast.Attribute, ast.Subscript)) and not isinstance(node.ctx, ast.Load):
+            name = _root_name(node.value)
+            if name:
+                (self.mutates if top else self.global_writes).add(name)
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                name = _root_name(node.func.value)
+                if name:
+                    (self.method_calls if top else self.global_method_calls).add(name)
+            func = node.func.id if isinstance(node.func, ast.Name) else None
+            args = [arg.value if isinstance(arg, ast.Starred) else arg for arg in node.args]
+            args += [keyword.value for keyword in node.keywords]
+            (self.call_args if top else self.global_call_args)[func].update(
+                arg.id for arg in args if isinstance(arg, ast.Name)
+            )
+
+        if isinstance(node, _SCOPES):
+            if top and not isinstance(node, ast.Lambda):
+                self.defines.add(node.name)
+            # Reads anywhere inside are still dependencies, e.g. a function body using a global
+            top = False
+
+        for child in ast.iter_child_nodes(node):
+            self._visit(child, top)
+
+
+class IncrementalPlan:
+    """
+    Decides which statements of new source code need to run,
+    given the statements from the previous run.
+
+    If `full` is True, the whole program must run from scratch after a reset,
+    and `reason` explains why.
+    Otherwise only the statements in `rerun` are executed against the existing namespace,
+    after deleting the names in `stale_names`.
+    """
+
+    def __init__(self, source_code: str, previous: Optional[List[Statement]]):
+        self.full = True
+        self.reason = ""
+        self.rerun: List[Statement] = []
+        self.stale_names: Set[str] = set()
+        try:
+            self.statements = [Statement(node) for node in ast.parse(source_code).body]
+        except SyntaxError:
+            self.statements = []
+            self.reason = "syntax error"
+            return
+
+        self._add_indirect_defines()
+        if previous is None:
+            self.reason = "no previous run"
+        else:
+            self._plan(previous)
+
+        if self.full:
+            self.rerun = self.statements
+
+    def _plan(self, previous: List[Statement]):
+        old = [s for s in previous if s.completed]
+        matcher = SequenceMatcher(None, [s.key for s in old], [s.key for s in self.statements], autojunk=False)
+        matched: Dict[int, Statement] = {}
+        for i, j, n in matcher.get_matching_blocks():
+            for k in range(n):
+                matched[j + k] = old[i + k]
+        matched_old = set(map(id, matched.values()))
+
+        # Names whose values may differ from a fresh run of the new code,
+        # starting with those bound by statements that are gone or never finished
+        dirty: Set[str] = set()
+        for s in previous:
+            if id(s) not in matched_old:
+                dirty |= s.defines
+        defined_now = set().union(*(s.defines for s in self.statements))
+        self.stale_names = dirty - defined_now
+
+        for j, s in enumerate(self.statements):
+            before = matched.get(j)
+            changed = before is None or (s.has_code and before.lineno != s.lineno)
+            if changed or (s.reads | s.defines) & dirty:
+                self.rerun.append(s)
+                dirty |= s.defines
+            else:
+                s.completed = True
+
+        if "*" in dirty:
+            self.reason = "a star import changed"
+        elif not self.rerun:
+            self.reason = "nothing changed"
+        elif len(self.rerun) == len(self.statements):
+            self.reason = "everything changed"
+        else:
+            self.full = False
+
+    def _add_indirect_defines(self):
+        """
+        Counts names changed in place as defined by the statements changing them,
+        so that e.g. removing `data.append(3)` reruns the statement creating `data` and those using it.
+        This is also done for the global names that calling a function may assign or change.
+
+        Names passed to a function are assumed to be changed by it, except for some builtins like print,
+        and changing a name is assumed to change any name its value came from,
+        e.g. after `hand = deck` or `row = grid[0]`, so this errs on the side of rerunning too much.
+        Calling methods of imported names (e.g. `math.sqrt(x)`) isn't counted,
+        otherwise every statement using a module would rerun whenever one of them changed.
+        """
+        imported = {
+            name
+            for s in self.statements
+            if isinstance(s.node, (ast.Import, ast.ImportFrom))
+            for name in s.defines
+        }
+        # The names that the value of each name bound by the code may come from
+        bound_from: Dict[str, Set[str]] = defaultdict(set)
+        for s in self.statements:
+            if not isinstance(s.node, (ast.Import, ast.ImportFrom)):
+                for name in s.defines:
+                    bound_from[name] |= s.reads
+        pure = _PURE_BUILTINS - bound_from.keys() - imported
+
+        def changed(names: Set[str], call_args: Dict[Optional[str], Set[str]]) -> Set[str]:
+            todo = list(names.union(*(args for func, args in call_args.items() if func not in pure)))
+            result = set()
+            while todo:
+                name = todo.pop()
+                if name not in result and name not in imported:
+                    result.add(name)
+                    todo.extend(n for n in bound_from.get(name, ()) if n in bound_from)
+            return result
+
+        for s in self.statements:
+            s.defines |= s.mutates | changed(s.mutates | s.method_calls, s.call_args)
+            s.global_writes |= changed(s.global_method_calls, s.global_call_args)
+
+        global_writes = self._global_writes()
+        for s in self.statements:
+            for name in s.reads:
+                s.defines |= global_writes.get(name, set())
+
+    def _global_writes(self) -> Dict[str, Set[str]]:
+        """
+        Maps the names of top-level functions and classes to the global names
+        they (or functions they use) may assign when called.
+        """
+        result = {name: set(s.global_writes) for s in self.statements if s.global_writes for name in s.defines}
+        if not result:
+            return result
+        by_name = {name: s for s in self.statements for name in s.defines}
+        changed = True
+        while changed:
+            changed = False
+            for name, writes in list(result.items()):
+                s = by_name.get(name)
+                for read in (s.reads if s else ()):
+                    extra = result.get(read, set()) - writes
+                    if extra:
+                        writes |= extra
+                        changed = True
+        return result
+
+    def module(self) -> ast.Module:
+        """
+        A module containing only the statements to rerun, keeping their original line numbers.
+        """
+        return ast.Module(body=[s.node for s in self.rerun], type_ignores=[])
+
+    def mark_completed(self, exc: Optional[BaseException], code_obj: CodeType):
+        """
+        Records which statements finished running, given the exception (if any)
+        that stopped the code.
+        """
+        lineno = _failing_lineno(exc.__traceback__, code_obj) if exc else None
+        for s in self.rerun:
+            if exc and (lineno is None or lineno <= s.end_lineno):
+                break
+            s.completed = True
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    """
+    Returns the name at the root of an expression like `a.b[0].c`, if any.
+    """
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _failing_lineno(tb: Optional[TracebackType], code_obj: CodeType) -> Optional[int]:
+    while tb and tb.tb_frame.f_code is not code_obj:
+        tb = tb.tb_next
+    return tb.tb_lineno if tb else None
+
+
+def exec_incremental(runner: 'Runner', code_obj: CodeType):
+    plan = runner.incremental_plan
+    runner.incremental_statements = plan.statements
+    for name in plan.stale_names:
+        runner.console.locals.pop(name, None)
+
+    try:
+        result = runner.execute(code_obj)
+    except BaseException as e:
+        plan.mark_completed(e, code_obj)
+        raise
+
+    if isinstance(result, Awaitable):
+        return _await_incremental(plan, code_obj, result)
+
+    plan.mark_completed(None, code_obj)
+    return result
+
+
+async def _await_incremental(plan: IncrementalPlan, code_obj: CodeType, result: Awaitable):
+    try:
+        result = await result
+    except BaseException as e:
+        plan.mark_completed(e, code_obj)
+        raise
+    plan.mark_completed(None, code_obj)
+    return result
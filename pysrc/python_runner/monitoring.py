@@ -0,0 +1,74 @@
+import inspect
+import sys
+from collections.abc import Awaitable
+from contextlib import ExitStack, contextmanager
+from types import CodeType
+from typing import Callable, ContextManager, Dict, Iterable, Iterator
+
+# sys.monitoring is only available in Python 3.12+, otherwise we fall back to sys.settrace
+MONITORING = hasattr(sys, "monitoring")
+
+
+def code_objects(root_code: CodeType) -> Iterator[CodeType]:
+    """
+    Yields the given code object and all code objects nested within it,
+    e.g. the bodies of functions, classes and comprehensions.
+    """
+    yield root_code
+    for sub_code_obj in root_code.co_consts:
+        if inspect.iscode(sub_code_obj):
+            yield from code_objects(sub_code_obj)
+
+
+@contextmanager
+def monitoring_tool(
+    tool_id: int,
+    name: str,
+    callbacks: Dict[int, Callable],
+    codes: Iterable[CodeType] = (),
+    local_events: int = 0,
+    global_events: int = 0,
+):
+    """
+    Context manager which claims a sys.monitoring tool ID, registers callbacks,
+    and enables `local_events` for the given code objects and `global_events` everywhere.
+    Everything is undone on exit.
+    """
+    mon = sys.monitoring  # type: ignore
+    codes = list(codes)
+    mon.use_tool_id(tool_id, name)
+    try:
+        for event, callback in callbacks.items():
+            mon.register_callback(tool_id, event, callback)
+        for code in codes:
+            mon.set_local_events(tool_id, code, local_events)
+        mon.set_events(tool_id, global_events)
+        yield mon
+    finally:
+        mon.set_events(tool_id, 0)
+        for code in codes:
+            mon.set_local_events(tool_id, code, 0)
+        for event in callbacks:
+            mon.register_callback(tool_id, event, None)
+        mon.free_tool_id(tool_id)
+        # Re-enable any locations disabled by callbacks returning DISABLE
+        mon.restart_events()
+
+
+def execute_within(runner, code_obj: CodeType, context: ContextManager):
+    """
+    Executes code_obj with runner.execute inside the given context manager.
+    If the code returns an awaitable (i.e. it uses top level await),
+    the context is only exited once the awaitable returned by this function is done.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(context)
+        result = runner.execute(code_obj)
+        if isinstance(result, Awaitable):
+            return _await_within(stack.pop_all(), result)
+        return result
+
+
+async def _await_within(stack: ExitStack, result: Awaitable):
+    with stack:
+        return await result
@@ -1,7 +1,268 @@
+import builtins
+import copy
 import sys
 import time
+from collections import deque
 from contextlib import contextmanager, redirect_stdout, redirect_stderr
-from typing import List, Union, Any, Dict
+from typing import Callable, Deque, List, Optional, Union, Any, Dict
+
+
+class FlushPolicy:
+    """
+    Decides when an OutputBuffer calls its flush callback after output is put.
+    This default flushes every time, so output is never delayed.
+
+    Regardless of the policy, the runner flushes before every other callback event
+    (e.g. input, sleep, and thus every animation frame via pace()) and at the end of each run,
+    so output always stays in order with those events.
+    """
+
+    def should_flush(self, buffer: 'OutputBuffer', output_type: str) -> bool:
+        return True
+
+
+class CoalescingFlushPolicy(FlushPolicy):
+    """
+    Combines output into fewer callback events.
+    Flushes when any of these are true:
+    - The output type is in `barrier_types`, e.g. a traceback
+    - It's been at least `flush_time` seconds since the last flush,
+      which means output after a quiet period is sent immediately
+    - The length of the buffered text is at least `flush_length` characters
+
+    Note that nothing flushes buffered output while the code runs without
+    putting more output or calling back, e.g. during a long calculation.
+
+    Graphics can't be barriers here because they aren't output parts. For example, Strype draws through
+    its own JavaScript bridge rather than through the runner, so with this policy printed text could
+    appear a frame after a graphics update that came after it. Code drawing that way should flush first,
+    e.g. by calling `sys.stdout.flush()` (which flushes the OutputBuffer during a run) in the bridge's
+    entry point. Frames paced by sleep (e.g. pace()) are already in order, since the runner flushes
+    before every callback. Strype itself uses the default FlushPolicy, so it doesn't need this.
+    """
+
+    flush_length = 1000
+    flush_time = 1 / 60  # seconds, i.e. a typical animation frame
+    barrier_types = frozenset({"traceback", "syntax_error"})
+
+    def should_flush(self, buffer: 'OutputBuffer', output_type: str) -> bool:
+        return (
+            output_type in self.barrier_types
+            or time.time() - buffer.last_time >= self.flush_time
+            or buffer.pending_length >= self.flush_length
+        )
+
+
+def compact_line_edits(text: str) -> str:
+    """
+    Applies carriage returns and backspaces in text like a minimal terminal,
+    e.g. "\r10%\r20%\r30%" becomes "\r30%", so that progress bars and animations
+    don't accumulate every frame.
+
+    The text is assumed to continue a line which may already have been output,
+    so anything before the first carriage return is kept as it is,
+    as is that carriage return. If the cursor ends up before the end of the last line,
+    the result ends with a carriage return and the text up to the cursor to put it back there.
+    """
+    if "\r" not in text and "\b" not in text:
+        return text
+
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        prefix = ""
+        if i == 0:
+            cr = line.find("\r")
+            if cr == -1:
+                continue
+            prefix, line = line[:cr + 1], line[cr + 1:]
+        lines[i] = prefix + _render_line(line, restore_cursor=i == len(lines) - 1)
+    return "\n".join(lines)
+
+
+def _render_line(line: str, restore_cursor: bool) -> str:
+    rendered = ""
+    col = 0
+    for piece in line.split("\r"):
+        # Each piece starts at the beginning of the line and overwrites what's there
+        if "\b" not in piece:
+            rendered = piece + rendered[len(piece):]
+            col = len(piece)
+            continue
+        cells = list(rendered)
+        col = 0
+        for char in piece:
+            if char == "\b":
+                col = max(col - 1, 0)
+            else:
+                if col < len(cells):
+                    cells[col] = char
+                else:
+                    cells.append(char)
+                col += 1
+        rendered = "".join(cells)
+
+    if restore_cursor and col < len(rendered):
+        rendered += "\r" + rendered[:col]
+    return rendered
+
+
+class _ReprLimitReached(Exception):
+    pass
+
+
+class StreamingRepr:
+    """
+    Like reprlib.Repr, but writes the repr of an object in chunks of about `chunk_size` characters
+    as it goes instead of building the whole string first, and stops with '...' after `max_chars`.
+    Builtin containers show at most `max_items` items each and are nested at most `max_depth` deep.
+    Other objects use their own repr, cut short.
+
+    Set an instance as `OutputBuffer.streaming_repr` to use it for print() and the displayhook.
+    """
+
+    max_chars = 100_000
+    max_items = 1000
+    max_depth = 20
+    chunk_size = 4096
+
+    # Types whose repr is built item by item: (opening, closing)
+    brackets = {
+        list: ("[", "]"),
+        tuple: ("(", ")"),
+        dict: ("{", "}"),
+        set: ("{", "}"),
+        frozenset: ("frozenset({", "})"),
+        deque: ("deque([", "])"),
+    }
+
+    def write(self, obj: Any, write: Callable[[str], Any]):
+        """
+        Writes the repr of obj by calling `write` one or more times.
+        """
+        # The state is kept on a copy in case a __repr__ method calls print()
+        state = copy.copy(self)
+        state._write = write
+        state._chunks = []
+        state._chunks_length = 0
+        state._remaining = self.max_chars
+        state._seen = set()
+        try:
+            state._repr(obj, 0)
+        except _ReprLimitReached:
+            pass
+        finally:
+            state._write_chunks()
+
+    def write_str(self, obj: Any, write: Callable[[str], Any]):
+        """
+        Writes str(obj), streaming it if it's the same as the repr, as for containers and numbers.
+        """
+        if isinstance(obj, str):
+            write(obj)
+        elif type(obj).__str__ is object.__str__:
+            self.write(obj, write)
+        else:
+            write(str(obj))
+
+    def _repr(self, obj: Any, level: int):
+        typ = type(obj)
+        if typ is str:
+            # Only the part of the string which can be shown is copied
+            self._emit(repr(obj[:self._remaining + 1]))
+            return
+
+        opening, closing = self.brackets.get(typ, ("", ""))
+        if not opening or not obj:
+            self._emit(repr(obj))
+            return
+        if typ is deque and obj.maxlen is not None:
+            closing = f"], maxlen={obj.maxlen})"
+        if level >= self.max_depth or id(obj) in self._seen:
+            self._emit(opening + "..." + closing)
+            return
+
+        self._seen.add(id(obj))
+        self._emit(opening)
+        for i, item in enumerate(obj.items() if typ is dict else obj):
+            if i:
+                self._emit(", ")
+            if i >= self.max_items:
+                self._emit("...")
+                break
+            if typ is dict:
+                self._repr(item[0], level + 1)
+                self._emit(": ")
+                self._repr(item[1], level + 1)
+            else:
+                self._repr(item, level + 1)
+        if typ is tuple and len(obj) == 1:
+            self._emit(",")
+        self._emit(closing)
+        self._seen.discard(id(obj))
+
+    def _emit(self, text: str):
+        if len(text) > self._remaining:
+            self._add_chunk(text[:self._remaining] + "...")
+            raise _ReprLimitReached
+        self._remaining -= len(text)
+        self._add_chunk(text)
+
+    def _add_chunk(self, text: str):
+        self._chunks.append(text)
+        self._chunks_length += len(text)
+        if self._chunks_length >= self.chunk_size:
+            self._write_chunks()
+
+    def _write_chunks(self):
+        if self._chunks:
+            text = "".join(self._chunks)
+            self._chunks = []
+            self._chunks_length = 0
+            self._write(text)
+
+    @contextmanager
+    def patch_console(self):
+        """
+        Context manager to temporarily replace builtins.print and sys.displayhook
+        with versions which use this repr when writing to a SysStream.
+        """
+        original_print = builtins.print
+        original_displayhook = sys.displayhook
+
+        def print_(*args, sep=" ", end="\n", file=None, flush=False):
+            if file is None:
+                file = sys.stdout
+            if not isinstance(file, SysStream):
+                return original_print(*args, sep=sep, end=end, file=file, flush=flush)
+            sep = " " if sep is None else sep
+            end = "\n" if end is None else end
+            for name, value in (("sep", sep), ("end", end)):
+                if not isinstance(value, str):
+                    raise TypeError(f"{name} must be None or a string, not {type(value).__name__}")
+
+            for i, arg in enumerate(args):
+                if i:
+                    file.write(sep)
+                self.write_str(arg, file.write)
+            file.write(end)
+            if flush:
+                file.flush()
+
+        def displayhook(value):
+            if value is None:
+                return
+            builtins._ = None  # type: ignore
+            self.write(value, sys.stdout.write)
+            sys.stdout.write("\n")
+            builtins._ = value  # type: ignore
+
+        builtins.print = print_
+        sys.displayhook = displayhook
+        try:
+            yield
+        finally:
+            builtins.print = original_print
+            sys.displayhook = original_displayhook
 
 
 class OutputBuffer:
@@ -10,15 +271,81 @@ class OutputBuffer:
     """
 
     # See should_flush
-    flush_length = 1000
-    flush_time = 1  # seconds
+    flush_policy: FlushPolicy = FlushPolicy()
+
+    # Limits on the amount of output of these types in each run, None meaning no limit.
+    # Beyond the limits, only the last `tail_length` characters are kept,
+    # and they're output at the end of the run after a single 'truncated' part saying how much was dropped.
+    # Other output such as input prompts still goes out as usual in the meantime,
+    # except that the tail is output first before the types in `tail_barrier_types`, which end a run.
+    max_output_chars: Optional[int] = None
+    max_output_lines: Optional[int] = None
+    tail_length = 2000
+    limited_types = frozenset({"stdout", "stderr"})
+    tail_barrier_types = frozenset({"traceback", "syntax_error"})
+
+    # Output types whose pending text has carriage returns and backspaces applied
+    # (see compact_line_edits) before it's flushed, e.g. {"stdout", "stderr"}.
+    # Off by default since consoles which don't interpret them would show different text.
+    compact_types: frozenset = frozenset()
+
+    # If set, print() and the displayhook use this instead of building the full repr of objects
+    streaming_repr: Optional[StreamingRepr] = None
 
     def __init__(self, flush):
         self._flush = flush
+        self.start_run()
+
+    def start_run(self):
+        """
+        Discards pending output and resets the output limits, called before each run.
+        """
         self.reset()
+        self.output_chars = 0
+        self.output_lines = 0
+        self.truncating = False
+        self.truncated_chars = 0
+        self.truncated_lines = 0
+        # [output_type, text] lists
+        self._tail: Deque[List[str]] = deque()
+        self._tail_length = 0
+
+    def finish_run(self):
+        """
+        Outputs anything held back by the output limits, then flushes. Called after each run.
+        """
+        self._release_tail()
+        self.truncating = False
+        self.flush()
+
+    def _release_tail(self):
+        """
+        Outputs a 'truncated' part with the amount of output dropped so far, followed by the kept tail.
+        If the tail holds all the output past the limits, it's output without a 'truncated' part.
+        """
+        if not (self._tail or self.truncated_chars):
+            return
+        dropped_chars = self.truncated_chars - self._tail_length
+        if dropped_chars:
+            tail_lines = sum(text.count("\n") for _, text in self._tail)
+            dropped_lines = self.truncated_lines - tail_lines
+            self._append(
+                "truncated",
+                f"\n... {dropped_chars} characters ({dropped_lines} lines) of output omitted ...\n",
+                dict(dropped_chars=dropped_chars, dropped_lines=dropped_lines),
+            )
+        for output_type, text in self._tail:
+            self._append(output_type, text, {})
+        self._tail.clear()
+        self._tail_length = 0
+        self.truncated_chars = 0
+        self.truncated_lines = 0
 
     def reset(self):
         self.parts: List[Dict[str, Any]] = []
+        # Text of the last part, joined when it's finished to avoid repeated string concatenation
+        self._chunks: List[str] = []
+        self.pending_length = 0
         self.last_time = time.time()
 
     def put(self, output_type: str, text: Union[str, bytes], **extra):
@@ -35,36 +362,116 @@ class OutputBuffer:
             raise TypeError(f"Can only write str, not {type(text).__name__}")
         assert isinstance(output_type, str)
 
-        if self.parts and self.parts[-1]["type"] == output_type and not extra:
-            self.parts[-1]["text"] += text
+        if output_type in self.limited_types and (
+            self.max_output_chars is not None or self.max_output_lines is not None
+        ):
+            text = self._limit(output_type, text)
+            if not text:
+                return
+        elif self.truncating and output_type in self.tail_barrier_types:
+            # Keep the tail before the error that ended the run
+            self._release_tail()
+
+        self._append(output_type, text, extra)
+
+        if self.should_flush(output_type):
+            self.flush()
+
+    def _append(self, output_type: str, text: str, extra: Dict[str, Any]):
+        if self.parts and self.parts[-1]["type"] == output_type and not extra and self._chunks:
+            self._chunks.append(text)
         else:
+            self._finish_part()
             self.parts.append(dict(type=output_type, text=text, **extra))
+            if not extra:
+                self._chunks.append(text)
+        self.pending_length += len(text)
 
-        if self.should_flush():
-            self.flush()
+    def _limit(self, output_type: str, text: str) -> str:
+        """
+        Returns the part of text within the output limits, keeping the rest in the tail.
+        """
+        if self.truncating:
+            self._add_tail(output_type, text)
+            return ""
+
+        end = len(text)
+        if self.max_output_chars is not None:
+            end = min(end, max(self.max_output_chars - self.output_chars, 0))
+        if self.max_output_lines is not None:
+            remaining = self.max_output_lines - self.output_lines
+            if text.count("\n", 0, end) >= remaining:
+                # End just after the last allowed newline
+                end = 0
+                for _ in range(max(remaining, 0)):
+                    end = text.index("\n", end) + 1
 
-    def should_flush(self) -> bool:
+        head = text[:end]
+        self.output_chars += len(head)
+        self.output_lines += head.count("\n")
+        if end < len(text):
+            self.truncating = True
+            self._add_tail(output_type, text[end:])
+        return head
+
+    def _add_tail(self, output_type: str, text: str):
+        self.truncated_chars += len(text)
+        self.truncated_lines += text.count("\n")
+        text = text[-self.tail_length:] if self.tail_length > 0 else ""
+        if self._tail and self._tail[-1][0] == output_type:
+            self._tail[-1][1] += text
+        else:
+            self._tail.append([output_type, text])
+        self._tail_length += len(text)
+
+        while self._tail and self._tail_length > self.tail_length:
+            excess = self._tail_length - self.tail_length
+            first = self._tail[0]
+            if len(first[1]) <= excess:
+                self._tail.popleft()
+                self._tail_length -= len(first[1])
+            else:
+                first[1] = first[1][excess:]
+                self._tail_length -= excess
+
+    def _finish_part(self):
+        if self._chunks:
+            part = self.parts[-1]
+            part["text"] = "".join(self._chunks)
+            self._chunks = []
+            if part["type"] in self.compact_types:
+                part["text"] = compact_line_edits(part["text"])
+
+    def should_flush(self, output_type: str = "") -> bool:
         """
         Determines whether flush() should be called after a call to put().
-        By default, returns True if any of these are true:
-        - There are multiple parts (which typically means multiple different part types)
-        - It's been at least a second since the last flush
-        - The combined length of all the 'text' values is at least 1000 characters
-        """
-        #return (
-        #    len(self.parts) > 1
-        #    or self.last_time and time.time() - self.last_time > self.flush_time
-        #    or sum(len(p["text"]) for p in self.parts) >= self.flush_length
-        #)
-        # NCCB changed: always flush, i.e. turn off the caching functionality
-        return True
+        Delegates to `flush_policy`, which by default always returns True.
+        NCCB changed: always flush, i.e. turn off the caching functionality.
+        Use CoalescingFlushPolicy to combine output into fewer callbacks.
+        """
+        return self.flush_policy.should_flush(self, output_type)
 
     def flush(self):
         if not self.parts:
             return
+        self._finish_part()
         self._flush(self.parts)
         self.reset()
 
+    def take_parts(self) -> List[Dict[str, Any]]:
+        """
+        Returns what flush() would pass to the flush callback, without calling it,
+        e.g. to send pending output along with another callback event.
+        """
+        parts: List[Dict[str, Any]] = []
+        flush = self._flush
+        self._flush = parts.extend
+        try:
+            self.flush()
+        finally:
+            self._flush = flush
+        return parts
+
     @contextmanager
     def redirect_std_streams(self):
         """
@@ -73,7 +480,11 @@ class OutputBuffer:
         """
         with redirect_stdout(SysStream("stdout", self)):  # noqa
             with redirect_stderr(SysStream("stderr", self)):  # noqa
-                yield
+                if self.streaming_repr:
+                    with self.streaming_repr.patch_console():
+                        yield
+                else:
+                    yield
 
 
 class SysStream:
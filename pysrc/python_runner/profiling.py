@@ -0,0 +1,146 @@
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional, Tuple
+
+from .monitoring import MONITORING, code_objects, execute_within, monitoring_tool
+
+TYPING = False
+if TYPING:
+    from .runner import Runner
+
+
+class LineProfile:
+    """
+    Per-line hit counts and cumulative times for the user's code.
+    The time of a line includes the time spent in any calls it makes.
+    """
+
+    def __init__(self):
+        self.hits: Dict[int, int] = defaultdict(int)
+        self.times: Dict[int, float] = defaultdict(float)
+        self.total_time = 0.0
+
+    def enter_line(self, entry: List[Any], lineno: Optional[int]):
+        """
+        `entry` is a [lineno, start_time] list tracking the current line of one frame.
+        Charges the time since the frame's previous line to that line,
+        then records that the frame is now at `lineno` (None if the frame is finished).
+        """
+        now = perf_counter()
+        if entry[0] is not None:
+            self.times[entry[0]] += now - entry[1]
+        if lineno is not None:
+            self.hits[lineno] += 1
+        entry[0] = lineno
+        entry[1] = now
+
+    @contextmanager
+    def monitor(self, code_obj: CodeType):
+        """
+        Profiles using sys.monitoring, which only adds overhead to the given code and the code nested in it.
+        """
+        events = sys.monitoring.events  # type: ignore
+        codes = set(code_objects(code_obj))
+        # (code, [lineno, start_time]) for each running frame of user code
+        stack: List[Tuple[CodeType, List[Any]]] = []
+
+        def start(code, _offset):
+            stack.append((code, [None, perf_counter()]))
+
+        def line(code, lineno):
+            if not stack or stack[-1][0] is not code:
+                start(code, 0)
+            self.enter_line(stack[-1][1], lineno)
+
+        def stop(code, _offset, _arg):
+            if code in codes and stack and stack[-1][0] is code:
+                self.enter_line(stack.pop()[1], None)
+
+        with monitoring_tool(
+            sys.monitoring.PROFILER_ID,  # type: ignore
+            "python_runner profile",
+            {
+                events.PY_START: start,
+                events.PY_RESUME: start,
+                events.LINE: line,
+                events.PY_RETURN: stop,
+                events.PY_YIELD: stop,
+                events.PY_UNWIND: stop,
+            },
+            codes=codes,
+            local_events=events.PY_START | events.PY_RESUME | events.LINE | events.PY_RETURN | events.PY_YIELD,
+            # Exceptions propagating out of a frame can only be monitored globally
+            global_events=events.PY_UNWIND,
+        ):
+            yield
+
+    @contextmanager
+    def trace(self, filename: str):
+        """
+        Profiles using sys.settrace, for Python versions without sys.monitoring.
+        """
+        # [lineno, start_time] for each running frame of user code
+        frames: Dict[FrameType, List[Any]] = {}
+
+        def global_trace(frame, _event, _arg):
+            if frame.f_code.co_filename != filename:
+                return None
+            frames[frame] = [None, perf_counter()]
+            return local_trace
+
+        def local_trace(frame, event, _arg):
+            entry = frames.get(frame) or frames.setdefault(frame, [None, perf_counter()])
+            if event == "line":
+                self.enter_line(entry, frame.f_lineno)
+            elif event == "return":
+                self.enter_line(frames.pop(frame), None)
+            return local_trace
+
+        old_trace = sys.gettrace()
+        sys.settrace(global_trace)
+        try:
+            yield
+        finally:
+            sys.settrace(old_trace)
+
+    @contextmanager
+    def timed(self):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.total_time += perf_counter() - start
+
+    def serialize(self, limit: int = 5) -> dict:
+        """
+        Returns the data for the 'profile' output part.
+        `lines` has an entry for every line that ran, while `text` summarises the `limit` slowest lines.
+        """
+        lines = [
+            dict(lineno=lineno, hits=self.hits.get(lineno, 0), time=self.times.get(lineno, 0.0))
+            for lineno in sorted(set(self.hits) | set(self.times))
+        ]
+        slowest = sorted(lines, key=lambda line: line["time"], reverse=True)[:limit]
+        text = f"Profile: {len(lines)} lines ran in {self.total_time:.3f}s\n" + "".join(
+            f"  line {line['lineno']}: {line['hits']} hits, {line['time']:.3f}s\n"
+            for line in slowest
+        )
+        return dict(text=text, lines=lines, total_time=self.total_time)
+
+
+def exec_profile(runner: 'Runner', code_obj: CodeType):
+    profile = LineProfile()
+
+    @contextmanager
+    def profiling():
+        try:
+            with profile.timed():
+                with profile.monitor(code_obj) if MONITORING else profile.trace(runner.filename):
+                    yield
+        finally:
+            runner.output("profile", **profile.serialize())
+
+    return execute_within(runner, code_obj, profiling())
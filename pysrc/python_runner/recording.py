@@ -0,0 +1,171 @@
+import asyncio
+import builtins
+import gzip
+import json
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .runner import PatchedSleepRunner, PatchedStdinRunner, Runner
+
+# Callback events whose responses aren't used, so they aren't replayed
+NOTIFICATION_EVENTS = frozenset({"output", "run_stats"})
+
+
+class ReplayError(RuntimeError):
+    """
+    Raised by ReplayRunner.replay when the code makes different callbacks from the recording.
+    """
+
+
+class Recording:
+    """
+    The callback events of one or more runs, recorded by a RecordingRunner,
+    which can be saved to a file and replayed by a ReplayRunner.
+
+    `events` is a list of dicts. Each run starts with an event 'run' with the source code and arguments of the run.
+    The other events have:
+    - event: the callback event type
+    - time: seconds since the start of the run
+    - duration: seconds spent in the callback
+    - data: the data passed to the callback, if any
+    - response: what the callback returned, if not None
+    - error: [exception type name, message] if the callback raised an exception
+    """
+
+    def __init__(self, events: Optional[List[Dict[str, Any]]] = None):
+        self.events = events if events is not None else []
+
+    def runs(self) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Returns a (run event, other events) pair for each run.
+        """
+        result: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+        for event in self.events:
+            if event["event"] == "run":
+                result.append((event, []))
+            elif result:
+                result[-1][1].append(event)
+        return result
+
+    def outputs(self) -> List[List[Dict[str, Any]]]:
+        """
+        Returns the list of output parts of each run, to compare with the result of ReplayRunner.replay.
+        """
+        return [
+            # Other events can also carry output, e.g. 'sleep' with PatchedSleepRunner.sleep_carries_output
+            [part for event in events for part in event.get("data", {}).get("parts", [])]
+            for _, events in self.runs()
+        ]
+
+    def save(self, path: str):
+        """
+        Writes the events as lines of JSON, compressed if the path ends with .gz.
+        """
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf8") as f:
+            for event in self.events:
+                f.write(json.dumps(event, separators=(",", ":"), default=repr) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+
+class RecordingRunner(Runner):  # noqa
+    """
+    Mixin which records every run and callback in `recording`.
+    Put it first in the bases so that it records the final responses of the callback,
+    e.g. `class MyRunner(RecordingRunner, PyodideRunner)`.
+    """
+
+    def __init__(self, *, recording: Optional[Recording] = None, **kwargs):
+        self.recording = recording if recording is not None else Recording()
+        self._run_start = perf_counter()
+        super().__init__(**kwargs)
+
+    def pre_run(self, source_code, mode="exec", top_level_await=False):
+        self._run_start = perf_counter()
+        self.recording.events.append(dict(
+            event="run",
+            source_code=source_code,
+            mode=mode,
+            top_level_await=top_level_await,
+            filename=self.filename,
+        ))
+        return super().pre_run(source_code, mode, top_level_await=top_level_await)
+
+    def callback(self, event_type: str, **data):
+        start = perf_counter()
+        event: Dict[str, Any] = dict(event=event_type, time=round(start - self._run_start, 6))
+        if data:
+            event["data"] = data
+        try:
+            response = super().callback(event_type, **data)
+        except Exception as e:
+            event["error"] = [type(e).__name__, str(e)]
+            raise
+        else:
+            if response is not None:
+                # e.g. convert a JsProxy from Pyodide
+                event["response"] = response.to_py() if hasattr(response, "to_py") else response
+            return response
+        finally:
+            event["duration"] = round(perf_counter() - start, 6)
+            # Any output flushed by this callback was recorded first
+            self.recording.events.append(event)
+
+
+class ReplayRunner(PatchedStdinRunner, PatchedSleepRunner):
+    """
+    Runs the code in a Recording again without any UI, giving each callback its recorded response
+    immediately (so sleeping takes no time) and collecting the output in `parts`.
+    """
+
+    def __init__(self, recording: Recording, **kwargs):
+        self.recording = recording
+        self.parts: List[Dict[str, Any]] = []
+        self.mismatch: Optional[str] = None
+        self._responses: Iterator[Dict[str, Any]] = iter(())
+        super().__init__(callback=self.handle_event, **kwargs)
+
+    def handle_event(self, event_type: str, data: Dict[str, Any]):
+        self.parts.extend(data.get("parts", []))
+        if event_type in NOTIFICATION_EVENTS:
+            return None
+
+        recorded = next(self._responses, None)
+        if recorded is None or recorded["event"] != event_type:
+            expected = repr(recorded["event"]) if recorded else "nothing"
+            self.mismatch = self.mismatch or f"The code made a {event_type!r} callback where {expected} was recorded"
+            raise ReplayError(self.mismatch)
+        if "error" in recorded:
+            name, message = recorded["error"]
+            exc_type = getattr(builtins, name, None)
+            if not (isinstance(exc_type, type) and issubclass(exc_type, Exception)):
+                exc_type = RuntimeError
+            raise exc_type(message)
+        return recorded.get("response")
+
+    def replay(self, mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Replays each run in the recording in order, returning the list of output parts of each,
+        like Recording.outputs. `mode` overrides the recorded mode, e.g. 'profile' to profile a recorded session.
+        Raises ReplayError if the code makes a callback which doesn't match the recording.
+        """
+        results = []
+        for run, events in self.recording.runs():
+            self.parts = []
+            self.mismatch = None
+            self._responses = iter([event for event in events if event["event"] not in NOTIFICATION_EVENTS])
+            self.set_filename(run["filename"])
+            run_mode = mode or run["mode"]
+            if run["top_level_await"]:
+                asyncio.run(self.run_async(run["source_code"], run_mode))
+            else:
+                self.run(run["source_code"], run_mode)
+            if self.mismatch:
+                raise ReplayError(self.mismatch)
+            results.append(self.parts)
+        return results
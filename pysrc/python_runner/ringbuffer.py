@@ -0,0 +1,217 @@
+import json
+import struct
+from typing import Any, Dict, List, Optional, Union
+
+from .output import OutputBuffer, compact_line_edits
+
+# The ring starts with the total numbers of bytes written and read,
+# as uint32s which wrap around, so the capacity must be a power of two.
+RING_HEADER = struct.Struct("<II")
+# Each frame is a type code and the length of the payload which follows it
+FRAME_HEADER = struct.Struct("<BI")
+POSITION_MASK = 0xFFFFFFFF
+
+# Frame type codes: the payload of JSON_PART is a whole part as JSON,
+# the others are the UTF-8 text of a part with no extra data.
+JSON_PART = 0
+TEXT_TYPES = {"stdout": 1, "stderr": 2}
+TEXT_CODES = {code: output_type for output_type, code in TEXT_TYPES.items()}
+
+
+class OutputRing:
+    """
+    Single producer, single consumer ring buffer of bytes over a writable buffer,
+    e.g. a bytearray or memory shared with JavaScript.
+
+    The writer only updates the write position and the reader only updates the read position,
+    so they can be in different threads as long as each position is written atomically.
+    """
+
+    def __init__(self, buffer: Optional[Any] = None, capacity: int = 1 << 20):
+        if buffer is None:
+            buffer = bytearray(RING_HEADER.size + capacity)
+        self.memory = memoryview(buffer).cast("B")
+        self.capacity = len(self.memory) - RING_HEADER.size
+        if self.capacity <= FRAME_HEADER.size or self.capacity & (self.capacity - 1):
+            raise ValueError("The ring capacity must be a power of two larger than a frame header")
+        self.data = self.memory[RING_HEADER.size:]
+
+    @property
+    def write_position(self) -> int:
+        return RING_HEADER.unpack_from(self.memory)[0]
+
+    @write_position.setter
+    def write_position(self, position: int):
+        struct.pack_into("<I", self.memory, 0, position & POSITION_MASK)
+
+    @property
+    def read_position(self) -> int:
+        return RING_HEADER.unpack_from(self.memory)[1]
+
+    @read_position.setter
+    def read_position(self, position: int):
+        struct.pack_into("<I", self.memory, 4, position & POSITION_MASK)
+
+    def write_at(self, position: int, data: Union[bytes, memoryview]):
+        """
+        Copies data into the ring starting at the given position, wrapping around the end.
+        """
+        start = position & (self.capacity - 1)
+        first = min(len(data), self.capacity - start)
+        self.data[start:start + first] = data[:first]
+        if first < len(data):
+            self.data[:len(data) - first] = data[first:]
+
+    def read_at(self, position: int, length: int) -> bytes:
+        start = position & (self.capacity - 1)
+        first = min(length, self.capacity - start)
+        result = self.data[start:start + first].tobytes()
+        if first < length:
+            result += self.data[:length - first].tobytes()
+        return result
+
+
+class RingOutputBuffer(OutputBuffer):
+    """
+    OutputBuffer which writes output into an OutputRing as frames,
+    instead of building lists of part dicts which must then be converted for the callback.
+    stdout and stderr text is written as UTF-8, and consecutive writes of the same type
+    extend the same frame until the next flush. Other parts are written as JSON in the same ring,
+    so the order of all output is kept.
+
+    A flush makes the frames visible to the reader and calls the flush callback with a single
+    'output_ring' part whose `end` is the new write position (and `bytes` the number of bytes added), telling the consumer to read the ring,
+    e.g. with RingReader, before handling any following parts. If the ring is too full for some output,
+    it's flushed first, then `wait_for_space` is called.
+
+    Output limits and flush policies work as in OutputBuffer,
+    while `compact_types` only applies within each write.
+    """
+
+    ring_capacity = 1 << 20
+
+    def __init__(self, flush, ring: Optional[OutputRing] = None):
+        self.ring = ring or OutputRing(capacity=self.ring_capacity)
+        # Where the next byte will be written, ahead of the ring's write position until a flush
+        self._cursor = self.ring.write_position
+        # [type code, position, payload length] of the last frame, which can be extended before a flush
+        self._open_frame: Optional[List[int]] = None
+        super().__init__(flush)
+
+    def reset(self):
+        super().reset()
+        # Discard any unflushed frames
+        self._cursor = self.ring.write_position
+        self._open_frame = None
+
+    def _append(self, output_type: str, text: str, extra: Dict[str, Any]):
+        if output_type in self.compact_types:
+            text = compact_line_edits(text)
+        code = TEXT_TYPES.get(output_type)
+        if code is None or extra:
+            part = dict(type=output_type, text=text, **extra)
+            payload = json.dumps(part).encode("utf8")
+            if len(payload) > self.ring.capacity - FRAME_HEADER.size:
+                self.flush()
+                self._flush([part])
+            elif not self._write_frame(JSON_PART, payload):
+                self._flush([part])
+        else:
+            self._write_text(code, text.encode("utf8", "replace"))
+        self.pending_length += len(text)
+
+    def _write_text(self, code: int, payload: bytes):
+        # Long text is split into several frames, without splitting UTF-8 sequences
+        max_length = self.ring.capacity - FRAME_HEADER.size
+        view = memoryview(payload)
+        while view:
+            end = len(view)
+            if end > max_length:
+                end = max_length
+                while view[end] & 0xC0 == 0x80:
+                    end -= 1
+            if not self._write_frame(code, view[:end]):
+                self._flush([dict(type=TEXT_CODES[code], text=view[:end].tobytes().decode("utf8"))])
+            view = view[end:]
+
+    def _write_frame(self, code: int, payload: Union[bytes, memoryview]) -> bool:
+        """
+        Writes a frame, or extends the open frame, returning False if there wasn't space even after flushing.
+        """
+        frame = self._open_frame
+        extend = bool(frame and frame[0] == code and frame[2] + len(payload) <= self.ring.capacity - FRAME_HEADER.size)
+        needed = len(payload) + (0 if extend else FRAME_HEADER.size)
+        if self._free_space() < needed:
+            # Flushing closes the open frame
+            self.flush()
+            extend = False
+            needed = FRAME_HEADER.size + len(payload)
+            if self._free_space() < needed and not self.wait_for_space(needed):
+                return False
+
+        if extend:
+            frame[2] += len(payload)  # type: ignore
+        else:
+            frame = self._open_frame = [code, self._cursor, len(payload)]
+            self._cursor += FRAME_HEADER.size
+        self.ring.write_at(frame[1], FRAME_HEADER.pack(code, frame[2]))  # type: ignore
+        self.ring.write_at(self._cursor, payload)
+        self._cursor += len(payload)
+        return True
+
+    def _free_space(self) -> int:
+        return self.ring.capacity - ((self._cursor - self.ring.read_position) & POSITION_MASK)
+
+    def wait_for_space(self, length: int) -> bool:
+        """
+        Called when `length` bytes don't fit in the ring even after flushing,
+        i.e. the consumer hasn't read the ring in response to the flush callback.
+        Subclasses can wait for the consumer here (e.g. with Atomics.wait in JavaScript)
+        and return True if there's now enough space.
+        Otherwise the output is passed directly to the flush callback as a normal part,
+        which is also done for parts too large for the ring.
+        """
+        return self._free_space() >= length
+
+    def flush(self):
+        if self._cursor == self.ring.write_position:
+            return
+        length = (self._cursor - self.ring.write_position) & POSITION_MASK
+        self.ring.write_position = self._cursor
+        self._open_frame = None
+        self._flush([dict(type="output_ring", text="", end=self.ring.write_position, bytes=length)])
+        self.reset()
+
+
+class RingReader:
+    """
+    Pure Python consumer of an OutputRing written by a RingOutputBuffer,
+    standing in for a JavaScript reader of shared memory.
+    """
+
+    def __init__(self, ring: OutputRing):
+        self.ring = ring
+
+    def read(self) -> List[Dict[str, Any]]:
+        """
+        Returns the output parts written since the last read, like the parts of an 'output' callback event,
+        and frees their space in the ring.
+        """
+        parts: List[Dict[str, Any]] = []
+        position = self.ring.read_position
+        end = self.ring.write_position
+        while position != end:
+            code, length = FRAME_HEADER.unpack(self.ring.read_at(position, FRAME_HEADER.size))
+            payload = self.ring.read_at(position + FRAME_HEADER.size, length)
+            position = (position + FRAME_HEADER.size + length) & POSITION_MASK
+            if code == JSON_PART:
+                parts.append(json.loads(payload))
+                continue
+            output_type = TEXT_CODES[code]
+            text = payload.decode("utf8")
+            if parts and parts[-1]["type"] == output_type and len(parts[-1]) == 2:
+                parts[-1]["text"] += text
+            else:
+                parts.append(dict(type=output_type, text=text))
+        self.ring.read_position = position
+        return parts
@@ -1,18 +1,26 @@
 import ast
 import builtins
-import linecache
+import hashlib
+import io
 import logging
 import os
 import sys
 import time
-import traceback
 from code import InteractiveConsole
+from collections import OrderedDict
 from collections.abc import Awaitable
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
 from types import CodeType, ModuleType, TracebackType
-from typing import Callable, Any, Dict, Optional, Union
+from typing import Callable, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from .budget import ExecutionBudget
+from .clock import VirtualClock
 from .output import OutputBuffer
+from .sampling import StackSampler
+from .sources import SourceRegistry, registry
+from .stats import RunStats
+from .tracebacks import format_exception
 
 log = logging.getLogger(__name__)
 
@@ -20,8 +28,121 @@ log = logging.getLogger(__name__)
 Callback = Callable[[str, Dict[str, Any]], Any]
 
 
+class CodeCache:
+    """
+    Bounded LRU cache of compiled code objects.
+    Running the same source code again (e.g. pressing Run twice without editing)
+    then skips compilation entirely.
+    Source code which failed to compile has its SyntaxError cached instead.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._codes: "OrderedDict[Tuple[str, str, str, bool], Union[CodeType, SyntaxError]]" = OrderedDict()
+
+    @staticmethod
+    def key(source_code: str, filename: str, mode: str, top_level_await: bool) -> Tuple[str, str, str, bool]:
+        # The filename is part of the key because it's baked into the code object
+        digest = hashlib.sha256(source_code.encode("utf8", "surrogatepass")).hexdigest()
+        return digest, filename, mode, bool(top_level_await)
+
+    def get(self, key: Tuple[str, str, str, bool]) -> Optional[Union[CodeType, SyntaxError]]:
+        code_obj = self._codes.get(key)
+        if code_obj is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._codes.move_to_end(key)
+        return code_obj
+
+    def put(self, key: Tuple[str, str, str, bool], code_obj: Union[CodeType, SyntaxError]):
+        self._codes[key] = code_obj
+        self._codes.move_to_end(key)
+        while len(self._codes) > max(self.maxsize, 0):
+            self._codes.popitem(last=False)
+
+    def clear(self):
+        self._codes.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._codes)
+
+
+def split_import_block(source_code: str) -> Optional[Tuple[str, str]]:
+    """
+    Splits source code into its leading import statements (optionally preceded by a docstring)
+    and the rest of the code, which has the import lines blanked out so that line numbers don't change.
+    Returns None if there are no leading imports or they can't be cleanly separated.
+    """
+    try:
+        body = ast.parse(source_code).body
+    except SyntaxError:
+        return None
+
+    end = 0
+    for i, node in enumerate(body):
+        is_docstring = (
+            i == 0
+            and isinstance(node, ast.Expr)
+            and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+        )
+        if isinstance(node, ast.ImportFrom) and node.module == "__future__":
+            # Future imports must stay at the top of the code they affect
+            return None
+        if not (is_docstring or isinstance(node, (ast.Import, ast.ImportFrom))):
+            if node.lineno <= end:
+                # e.g. `import x; y = 1`
+                return None
+            break
+        end = node.end_lineno or node.lineno
+
+    if not any(isinstance(node, (ast.Import, ast.ImportFrom)) for node in body[:2]):
+        return None
+
+    # Split lines the same way the compiler does, unlike str.splitlines
+    lines = io.StringIO(source_code, newline="").readlines()
+    return "".join(lines[:end]), "\n" * end + "".join(lines[end:])
+
+
+def only_comments(source_code: str) -> bool:
+    """
+    Returns True if source_code has no statements, just comments and blank lines,
+    without parsing it like ast.parse would.
+    """
+    return all(not line.strip() or line.lstrip().startswith("#") for line in source_code.splitlines())
+
+
 class Runner:
     OutputBufferClass = OutputBuffer
+    StackSamplerClass = StackSampler
+
+    # Shared by all runners, since a fresh runner may be created for each run
+    code_cache = CodeCache()
+
+    # Holds the user's source code in memory, for linecache and imports of other user modules
+    source_registry: SourceRegistry = registry
+
+    # If True, runs in 'exec' mode snapshot the namespace after the leading imports,
+    # and later runs with the same imports start from a copy of that snapshot
+    # instead of executing the imports again.
+    # Changing any user module in `source_registry` invalidates the snapshot.
+    warm_start = False
+
+    # If True, a 'run_stats' callback event is sent at the end of each run, see RunStats.
+    # If `trace_memory` is also True, it includes the peak memory traced by tracemalloc,
+    # which slows down the code considerably.
+    collect_stats = True
+    trace_memory = False
+
+    # Line numbers in the user's file where mode 'debug' pauses
+    breakpoints: Iterable[int] = ()
+
+    # Tracebacks with more frames than this only show the outermost and innermost, see CompactTraceback
+    traceback_max_frames = 100
 
     def __init__(
         self,
@@ -32,6 +153,12 @@ class Runner:
     ):
         self.set_callback(callback)  # type: ignore
         self.set_filename(filename)
+        self.warm_started = False
+        self.incremental_plan = None
+        self.incremental_statements = None
+        self.run_stats: Optional[RunStats] = None
+        self._warm_start_snapshot: Optional[Tuple[Tuple[str, int, str], Dict[str, Any]]] = None
+        self._warm_start_pending: Optional[Tuple[Tuple[str, int, str], CodeType]] = None
         self.set_source_code(source_code)
         self.console = InteractiveConsole()
         self.output_buffer = self.OutputBufferClass(
@@ -47,18 +174,8 @@ class Runner:
 
     def set_source_code(self, source_code: str):
         self.source_code = source_code
-        # Write to file if permitted by system
-        try:
-            with open(self.filename, "w") as f:
-                f.write(self.source_code)
-        except:  # pragma: no cover
-            pass 
-        linecache.cache[self.filename] = (
-            len(self.source_code),
-            0,
-            [line + "\n" for line in self.source_code.splitlines()],
-            self.filename,
-        )
+        # Nothing is written to disk, linecache gets the source lazily from the registry
+        self.source_registry.add(self.filename, source_code, module_name="__main__")
 
     def callback(self, event_type: str, **data):
         """
@@ -69,7 +186,17 @@ class Runner:
         if event_type != "output":
             self.output_buffer.flush()
 
-        return self._callback(event_type, data)
+        run_stats = self.run_stats
+        if not run_stats:
+            return self._callback(event_type, data)
+        if event_type == "output":
+            run_stats.add_output(data["parts"])
+            return self._callback(event_type, data)
+        start = perf_counter()
+        try:
+            return self._callback(event_type, data)
+        finally:
+            run_stats.add_callback(event_type, perf_counter() - start)
 
     def output(self, output_type: str, text: str, **extra):
         """
@@ -86,19 +213,52 @@ class Runner:
             from .snoop import exec_snoop, SnoopStream
             default_config = dict(columns=(), out=SnoopStream(self.output_buffer), color=False)
             exec_snoop(self, code_obj, snoop_config={**default_config, **(snoop_config or {})})
+        elif mode == "incremental":
+            from .incremental import exec_incremental
+            return exec_incremental(self, code_obj)
+        elif mode == "profile":
+            from .profiling import exec_profile
+            return exec_profile(self, code_obj)
+        elif mode == "sample":
+            from .sampling import exec_sampling
+            return exec_sampling(self, code_obj)
+        elif mode == "debug":
+            from .debugger import exec_debug
+            return exec_debug(self, code_obj)
+        elif mode == "coverage":
+            from .coverage import exec_coverage
+            return exec_coverage(self, code_obj)
         else:
+            if self._warm_start_pending:
+                key, imports_code = self._warm_start_pending
+                self._warm_start_pending = None
+                eval(imports_code, self.console.locals)
+                self._warm_start_snapshot = (key, dict(self.console.locals))
             return eval(code_obj, self.console.locals)  # type: ignore
 
     @contextmanager
     def _execute_context(self):
         with self.output_buffer.redirect_std_streams():
             try:
-                yield
+                with self._timed("exec_time"):
+                    yield
             except BaseException as e:
                 self.output("traceback", **self.serialize_traceback(e))
         self.post_run()
 
-    def run(self, source_code: str, mode: str = "exec", snoop_config: dict = None):
+    def _budget_context(self, budget: Optional[ExecutionBudget]):
+        return budget.enforce(self.filename) if budget else nullcontext()
+
+    def _timed(self, attribute: str):
+        return self.run_stats.timed(attribute) if self.run_stats else nullcontext()
+
+    def run(
+        self,
+        source_code: str,
+        mode: str = "exec",
+        snoop_config: dict = None,
+        budget: Optional[ExecutionBudget] = None,
+    ):
         """
         Run the given Python source_code.
         See also run_async.
@@ -109,14 +269,42 @@ class Runner:
         `mode` can also be 'snoop' which will run the code with the
         [snoop](https://github.com/alexmojaki/snoop) debugger (installed separately).
         An optional `snoop_config` dict can be passed
-        which will be used as keyword arguments for a snoop.Config object.
+        which will be used as keyword arguments for a snoop.Config object,
+        except for `max_events`: if that's given, only the last `max_events` trace events
+        are kept and output as a summary in one 'snoop' part at the end, see SnoopEventRing.
+
+        `mode` can also be 'incremental', which keeps the global variables from the previous
+        'incremental' run and only reruns the top-level statements that changed since then,
+        along with the statements that depend on them.
+        When that isn't possible (e.g. on the first run, or if a star import changed)
+        it falls back to a full run from scratch. See `incremental_plan` for what happened.
+
+        `mode` can also be 'profile', which counts how many times each line of the code runs
+        and how much time it takes (including calls), and outputs that as a 'profile' part at the end.
+
+        `mode` can also be 'sample', which periodically samples the stack of the running code
+        with much less overhead and outputs a 'samples' part at the end with flame graph data.
+        See `StackSamplerClass` for the options.
+
+        `mode` can also be 'debug', which pauses at the lines in `breakpoints` with a 'debug_pause' callback
+        event, whose response says whether to continue, step, or evaluate an expression. See Debugger.
+
+        `mode` can also be 'coverage', which records which lines of the code ran
+        and outputs them as a 'coverage' part at the end, see LineCoverage.
 
         If `mode` is 'eval', the return value will be the evaluated expression if successful.
+
+        Unless `collect_stats` is False, a 'run_stats' callback event is sent at the end
+        with timings and counts for the run, see RunStats.
+
+        An ExecutionBudget can be passed as `budget` to limit how long the code can run,
+        in which case BudgetExceeded is raised and reported like any other exception.
         """
         code_obj = self.pre_run(source_code, mode=mode)
         with self._execute_context():
             if code_obj:
-                return self.execute(code_obj, mode=mode, snoop_config=snoop_config)
+                with self._budget_context(budget):
+                    return self.execute(code_obj, mode=mode, snoop_config=snoop_config)
 
     async def run_async(
         self,
@@ -124,6 +312,7 @@ class Runner:
         mode: str = "exec",
         top_level_await: bool = True,
         snoop_config: dict = None,
+        budget: Optional[ExecutionBudget] = None,
     ):
         """
         Similar to the `run` method, but async.
@@ -132,10 +321,11 @@ class Runner:
         code_obj = self.pre_run(source_code, mode, top_level_await=top_level_await)
         with self._execute_context():
             if code_obj:
-                result = self.execute(code_obj, mode=mode, snoop_config=snoop_config)
-                while isinstance(result, Awaitable):
-                    result = await result
-                return result
+                with self._budget_context(budget):
+                    result = self.execute(code_obj, mode=mode, snoop_config=snoop_config)
+                    while isinstance(result, Awaitable):
+                        result = await result
+                    return result
 
     def skip_traceback_internals(self, tb: Optional[TracebackType]) -> Optional[TracebackType]:
         """
@@ -157,8 +347,7 @@ class Runner:
         It should at least have a key 'text' with a string value.
         """
         tb = self.skip_traceback_internals(exc.__traceback__)
-        lines = traceback.format_exception(type(exc), exc, tb)
-        return dict(text="".join(lines))
+        return dict(text=format_exception(exc, tb, self.traceback_max_frames))
 
     def serialize_syntax_error(self, exc: BaseException) -> dict:
         """
@@ -172,47 +361,144 @@ class Runner:
         """
         Compiles source_code into a code object.
         """
-        compile_mode = mode
-        if mode == "single":
-            source_code += "\n"  # Allow compiling single-line compound statements
-        elif mode != "eval":
-            compile_mode = "exec"
-            self.reset()
-        self.output_buffer.reset()
+        self.run_stats = RunStats(trace_memory=self.trace_memory) if self.collect_stats else None
+        source_code, pieces = self._pieces_to_compile(source_code, mode)
+        compile_mode = pieces[0][1]
+        split = len(pieces) > 1
+        self._warm_start_pending = None
+        if mode not in ("single", "eval"):
+            snapshot = self._warm_start_snapshot
+            self.warm_started = bool(split and snapshot and snapshot[0] == self._warm_start_key(pieces[1][0]))
+            if mode == "incremental":
+                from .incremental import IncrementalPlan
+                self.incremental_plan = IncrementalPlan(source_code, self.incremental_statements)
+                if self.incremental_plan.full:
+                    log.debug("Running all code from scratch: %s", self.incremental_plan.reason)
+                    self.reset()
+            else:
+                self.reset()
+        self.output_buffer.start_run()
 
         self.set_source_code(source_code)
 
         try:
-            return compile(
-                self.source_code,
-                self.filename,
-                compile_mode,
-                flags=top_level_await * ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
-            )
+            if split:
+                (rest_source, _), (imports_source, _) = pieces
+                code_obj = self.compile(rest_source, compile_mode, top_level_await)
+                if not self.warm_started:
+                    # Run the imports separately in `execute` and snapshot the result
+                    imports_code = self.compile(imports_source, compile_mode, top_level_await)
+                    self._warm_start_pending = (self._warm_start_key(imports_source), imports_code)
+                return code_obj
+            if mode == "incremental" and not self.incremental_plan.full:
+                with self._timed("compile_time"):
+                    return compile(
+                        self.incremental_plan.module(),
+                        self.filename,
+                        compile_mode,
+                        flags=top_level_await * ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+                    )
+            return self.compile(self.source_code, compile_mode, top_level_await)
         except SyntaxError as e:
-            try:
-                if not ast.parse(self.source_code).body:
-                    # Code is only comments, which cannot be compiled in 'single' mode
-                    return None
-            except SyntaxError:
-                pass
+            if only_comments(self.source_code):
+                # Code which is only comments cannot be compiled in 'single' mode
+                return None
 
             e.__traceback__ = None
             self.output("syntax_error", **self.serialize_syntax_error(e))
             return None
 
+    def precompile(self, source_code: str, mode: str = "exec", top_level_await: bool = False) -> Optional[dict]:
+        """
+        Compiles source_code ahead of running it, e.g. after each edit in an editor,
+        caching the result in `code_cache` so that a following `run` of the same code
+        with the same mode and filename doesn't need to compile it.
+        Returns None if the code compiles, otherwise the serialized syntax error,
+        like the data of a 'syntax_error' output part.
+        Calling this again with the same code is as cheap as a cache lookup,
+        since syntax errors are cached too.
+        """
+        source_code, pieces = self._pieces_to_compile(source_code, mode)
+        try:
+            for piece, compile_mode in pieces:
+                self.compile(piece, compile_mode, top_level_await)
+        except SyntaxError as e:
+            if only_comments(source_code):
+                return None
+            e.__traceback__ = None
+            return self.serialize_syntax_error(e)
+        return None
+
+    def _pieces_to_compile(self, source_code: str, mode: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        Returns the source code to run in the given mode (with a newline added in 'single' mode)
+        and the (source, compile mode) pairs which pre_run compiles for it:
+        the code after the imports followed by the imports for a warm start, otherwise the whole code.
+        """
+        if mode == "single":
+            # Allow compiling single-line compound statements
+            source_code += "\n"
+            return source_code, [(source_code, mode)]
+        if mode == "eval":
+            return source_code, [(source_code, mode)]
+        split = split_import_block(source_code) if self.warm_start and mode == "exec" else None
+        if split:
+            imports_source, rest_source = split
+            return source_code, [(rest_source, "exec"), (imports_source, "exec")]
+        return source_code, [(source_code, "exec")]
+
+    def _warm_start_key(self, imports_source: str) -> Tuple[str, int, str]:
+        # User modules registered in source_registry may have changed since the snapshot
+        # even if the imports haven't, so the registry's version is part of the key
+        return self.filename, self.source_registry.version, imports_source
+
+    def compile(self, source_code: str, mode: str = "exec", top_level_await: bool = False) -> CodeType:
+        """
+        Compiles source_code for self.filename, reusing a cached code object
+        from `code_cache` if the same source was compiled before.
+        Raises SyntaxError like the `compile` builtin, including for a cached SyntaxError.
+        """
+        with self._timed("compile_time"):
+            key = self.code_cache.key(source_code, self.filename, mode, top_level_await)
+            code_obj = self.code_cache.get(key)
+            if code_obj is None:
+                try:
+                    code_obj = compile(
+                        source_code,
+                        self.filename,
+                        mode,
+                        flags=top_level_await * ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+                    )
+                except SyntaxError as e:
+                    self.code_cache.put(key, e)
+                    raise
+                self.code_cache.put(key, code_obj)
+        if isinstance(code_obj, SyntaxError):
+            raise code_obj.with_traceback(None)
+        return code_obj
+
     def post_run(self):
-        self.output_buffer.flush()
+        self.output_buffer.finish_run()
+        if self.run_stats:
+            stats, self.run_stats = self.run_stats, None
+            stats.finish()
+            self.callback("run_stats", **stats.serialize())
 
     def reset(self):
         """
         Called before running code 'from scratch' (i.e. when `mode` is not 'single' or 'eval')
         to reset state such as global variables.
+        If `warm_started` is True, the namespace is restored from the warm start snapshot,
+        so subclasses can skip populating it again.
         """
         mod = ModuleType("__main__")
         mod.__file__ = self.filename
+        mod.__loader__ = self.source_registry
+        if self.warm_started and self._warm_start_snapshot:
+            mod.__dict__.update(self._warm_start_snapshot[1])
         sys.modules["__main__"] = mod
         self.console.locals = mod.__dict__
+        self.incremental_statements = None
         self.output_buffer.reset()
 
 
@@ -231,6 +517,19 @@ class FakeStdin:
 
 
 class PatchedStdinRunner(Runner):  # noqa
+    # Lines of input to read before calling back with 'input' events, see set_input_script
+    input_script: Optional[Iterator[Any]] = None
+
+    def set_input_script(self, script: Union[str, Iterable[str], None]):
+        """
+        Supplies input in advance, as a string, a list of lines, or a file-like object.
+        Lines are taken from it as needed without calling back, and only when it runs out
+        does reading input make 'input' callbacks again. Pass None to remove the script.
+        """
+        if isinstance(script, str):
+            script = script.splitlines()
+        self.input_script = iter(script) if script is not None else None
+
     def pre_run(self, *args, **kwargs):
         sys.stdin = FakeStdin(self.readline)
         builtins.input = self.input
@@ -245,7 +544,10 @@ class PatchedStdinRunner(Runner):  # noqa
 
     def readline(self, n=-1, prompt="") -> str:
         if not self.line and n:
-            value = self.callback("input", prompt=prompt)
+            value = next(self.input_script, None) if self.input_script else None
+            if value is None:
+                self.input_script = None
+                value = self.callback("input", prompt=prompt)
             if not isinstance(value, str):
                 value = self.non_str_input(value) or ""
             if not value.endswith("\n"):
@@ -265,15 +567,52 @@ class PatchedStdinRunner(Runner):  # noqa
 
 
 class PatchedSleepRunner(Runner):  # noqa
+    # If True, each run uses a new VirtualClock as `clock` for time.time, time.monotonic and time.perf_counter,
+    # and time.sleep advances it instantly instead of calling back with a 'sleep' event.
+    virtual_time = False
+    clock: Optional[VirtualClock] = None
+
+    # Sleeps are added up until the total is at least this many seconds,
+    # then there's one 'sleep' callback for the total, e.g. to make fewer callbacks for pace() at high frame rates.
+    # This means the code can get ahead of the real time by up to this much.
+    sleep_coalesce_time = 0.0
+    pending_sleep = 0.0
+
+    # If True, output pending at a 'sleep' callback is included in its data as `parts`
+    # instead of being flushed in a separate 'output' callback first.
+    sleep_carries_output = False
+
     def pre_run(self, *args, **kwargs):
         time.sleep = self.sleep
+        self.pending_sleep = 0.0
+        self.clock = None
+        if self.virtual_time:
+            self.clock = VirtualClock()
+            self.clock.install()
         return super().pre_run(*args, **kwargs)
 
+    def post_run(self):
+        if self.clock:
+            self.clock.uninstall()
+        super().post_run()
+
     def sleep(self, seconds: Union[int, float]):
         if not isinstance(seconds, (int, float)):
             raise TypeError(f"an integer is required (got type {type(seconds).__name__})")
         if not seconds >= 0:
             raise ValueError("sleep length must be non-negative")
+        if self.clock:
+            # Keep the output in order as if the callback was called
+            self.output_buffer.flush()
+            self.clock.sleep(seconds)
+            return None
+
+        self.pending_sleep += seconds
+        if self.pending_sleep < self.sleep_coalesce_time:
+            return None
+        seconds, self.pending_sleep = self.pending_sleep, 0.0
+        if self.sleep_carries_output:
+            return self.callback("sleep", seconds=seconds, parts=self.output_buffer.take_parts())
         return self.callback("sleep", seconds=seconds)
 
 
@@ -321,3 +660,78 @@ class PyodideRunner(PatchedStdinRunner, PatchedSleepRunner):  # noqa # pragma: n
             except RuntimeError as re:
                 if re not in (self.ServiceWorkerError, self.NoChannelError):
                     raise
+
+
+class AsyncPyodideRunner(PyodideRunner):  # noqa # pragma: no cover
+    """
+    A PyodideRunner for `run_async` where the callback can return an awaitable
+    (e.g. a JS Promise) instead of blocking, in particular for the 'input' and 'sleep' events.
+    The awaitable is awaited by suspending the whole Python stack with Pyodide's
+    JavaScript Promise Integration (`pyodide.ffi.run_sync`), so the event loop keeps running.
+    This makes `input()`, `time.sleep` and thus `strype.graphics.pause()` and `pace()`
+    suspension points rather than blocking synchronous calls.
+
+    Only one run can be in progress at a time, even across different runners,
+    because a run patches process-wide state such as `builtins.input`, `time.sleep`,
+    `sys.stdout` and `sys.modules['__main__']`. Calling `run_async` while another run
+    is suspended raises RuntimeError instead of letting the runs interfere.
+    """
+
+    # The runner whose run_async is in progress, if any
+    _active_runner: Optional['AsyncPyodideRunner'] = None
+
+    def __init__(self, **kwargs):
+        self._running_async = False
+        super().__init__(**kwargs)
+
+    def can_suspend(self) -> bool:
+        """
+        Whether `suspend` can be used, which requires running inside `run_async`
+        in a Pyodide runtime with JavaScript Promise Integration.
+        """
+        if not self._running_async:
+            return False
+        try:
+            from pyodide.ffi import can_run_sync  # type: ignore
+        except ImportError:
+            return False
+        return can_run_sync()
+
+    def suspend(self, awaitable: Awaitable) -> Any:
+        """
+        Blocks the Python code until the awaitable is done, without blocking the event loop.
+        """
+        from pyodide.ffi import run_sync  # type: ignore
+
+        return run_sync(awaitable)
+
+    def callback(self, event_type: str, **data):
+        result = super().callback(event_type, **data)
+        if isinstance(result, Awaitable):
+            if not self.can_suspend():
+                if hasattr(result, "close"):
+                    result.close()  # Avoid a warning about a coroutine never being awaited
+                raise RuntimeError(
+                    f"The callback for {event_type!r} returned an awaitable, "
+                    "which requires run_async in Pyodide with JavaScript Promise Integration."
+                )
+            start = perf_counter()
+            result = self.suspend(result)
+            if self.run_stats:
+                # Already counted by super().callback, which only timed creating the awaitable
+                self.run_stats.callback_times[event_type] += perf_counter() - start
+        return result
+
+    async def run_async(self, *args, **kwargs):
+        if AsyncPyodideRunner._active_runner is not None:
+            raise RuntimeError(
+                "Another run is still in progress. Only one run at a time is supported, "
+                "since runs patch process-wide state like builtins.input and sys.stdout."
+            )
+        AsyncPyodideRunner._active_runner = self
+        self._running_async = True
+        try:
+            return await super().run_async(*args, **kwargs)
+        finally:
+            self._running_async = False
+            AsyncPyodideRunner._active_runner = None
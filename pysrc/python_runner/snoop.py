@@ -1,12 +1,16 @@
 import ast
-import inspect
 import os
+from collections import deque
 from types import CodeType
+from typing import Any, Deque, FrozenSet, Tuple
+from weakref import WeakKeyDictionary, WeakValueDictionary
 
 import snoop  # type: ignore
 import snoop.formatting  # type: ignore
 import snoop.tracer  # type: ignore
+from snoop.utils import my_cheap_repr  # type: ignore
 
+from .monitoring import code_objects
 from .output import SysStream
 
 internal_dir = os.path.dirname(os.path.dirname(
@@ -29,6 +33,70 @@ class SnoopStream(SysStream):
         pass  # pragma: no cover
 
 
+class SnoopEventRing:
+    """
+    Used as the formatter of snoop when `max_events` is in the snoop config,
+    keeping only the last `max_events` trace events as data in a ring buffer
+    instead of writing every event as text, and outputting a summary at the end.
+    """
+
+    def __init__(self, max_events: int):
+        # (lineno, event, depth, function name, changed variables, returned value)
+        self.events: Deque[Tuple[int, str, int, str, Any, Any]] = deque(maxlen=max_events)
+        self.total_events = 0
+
+    def formatter(self, _prefix, _columns, _color):
+        # Called by snoop.Config as the formatter_class
+        return self
+
+    def format(self, event) -> str:
+        self.total_events += 1
+        value = my_cheap_repr(event.arg) if event.event == "return" else None
+        self.events.append((event.line_no, event.event, event.depth, event.code.co_name, event.variables, value))
+        return ""
+
+    def format_line_only(self, _event) -> str:
+        return ""
+
+    def serialize(self) -> dict:
+        """
+        Returns the data for the 'snoop' output part summarising the events.
+        """
+        events = []
+        lines = [f"Snoop: {self.total_events} events, showing the last {len(self.events)}\n"]
+        for lineno, event, depth, function, variables, value in self.events:
+            events.append(dict(lineno=lineno, event=event, depth=depth, function=function, variables=dict(variables)))
+            details = ", ".join(f"{name} = {value_repr}" for name, value_repr in variables)
+            if value is not None:
+                events[-1]["value"] = value
+                details = f"{details}, returned {value}" if details else f"returned {value}"
+            lines.append(f"{'    ' * depth}{lineno:>4} {event} {function}{': ' + details if details else ''}\n")
+        return dict(
+            text="".join(lines),
+            events=events,
+            total_events=self.total_events,
+            dropped=self.total_events - len(self.events),
+        )
+
+
+# (variable whitelist, target code objects) for each snooped code object
+_tracer_setups: 'WeakKeyDictionary[CodeType, Tuple[FrozenSet[str], FrozenSet[CodeType]]]' = WeakKeyDictionary()
+# The code object whose source snoop has cached for each filename
+_source_codes: 'WeakValueDictionary[str, CodeType]' = WeakValueDictionary()
+
+
+def tracer_setup(code_obj: CodeType, source_code: str) -> Tuple[FrozenSet[str], FrozenSet[CodeType]]:
+    """
+    Returns the names to show values of and the code objects to trace when snooping code_obj,
+    cached per code object since finding them means parsing the source and walking the nested code.
+    """
+    setup = _tracer_setups.get(code_obj)
+    if setup is None:
+        names = frozenset(node.id for node in ast.walk(ast.parse(source_code)) if isinstance(node, ast.Name))
+        setup = _tracer_setups[code_obj] = (names, frozenset(code_objects(code_obj)))
+    return setup
+
+
 def exec_snoop(runner: 'Runner', code_obj: CodeType, snoop_config: dict):
     class PatchedFrameInfo(snoop.tracer.FrameInfo):  # pragma: no cover (happens inside snoop's trace function)
         def __init__(self, *args, **kwargs):
@@ -37,25 +105,26 @@ def exec_snoop(runner: 'Runner', code_obj: CodeType, snoop_config: dict):
 
     snoop.tracer.FrameInfo = PatchedFrameInfo
 
-    snoop.formatting.Source._class_local('__source_cache', {}).pop(runner.filename, None)
-    config = snoop.Config(**snoop_config)
-    tracer = config.snoop()
-    tracer.variable_whitelist = set()
-    for node in ast.walk(ast.parse(runner.source_code)):
-        if isinstance(node, ast.Name):
-            name = node.id
-            tracer.variable_whitelist.add(name)
-    tracer.target_codes.add(code_obj)
-
-    def find_code(root_code: CodeType):
-        for sub_code_obj in root_code.co_consts:
-            if not inspect.iscode(sub_code_obj):
-                continue
+    if _source_codes.get(runner.filename) is not code_obj:
+        snoop.formatting.Source._class_local('__source_cache', {}).pop(runner.filename, None)
+        _source_codes[runner.filename] = code_obj
 
-            find_code(sub_code_obj)
-            tracer.target_codes.add(sub_code_obj)
+    snoop_config = dict(snoop_config)
+    ring = None
+    max_events = snoop_config.pop("max_events", None)
+    if max_events is not None:
+        ring = SnoopEventRing(max_events)
+        snoop_config.update(out=lambda _text: None, formatter_class=ring.formatter)
 
-    find_code(code_obj)
+    config = snoop.Config(**snoop_config)
+    tracer = config.snoop()
+    whitelist, target_codes = tracer_setup(code_obj, runner.source_code)
+    tracer.variable_whitelist = set(whitelist)
+    tracer.target_codes.update(target_codes)
 
-    with tracer:
-        runner.execute(code_obj)
+    try:
+        with tracer:
+            runner.execute(code_obj)
+    finally:
+        if ring:
+            runner.output("snoop", **ring.serialize())
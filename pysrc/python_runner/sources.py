@@ -0,0 +1,113 @@
+import functools
+import importlib.abc
+import importlib.util
+import linecache
+import os
+import sys
+from types import ModuleType
+from typing import Dict, Optional
+
+
+class SourceRegistry(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """
+    Holds the source code of user files in memory instead of on disk.
+
+    Source is served lazily to `linecache` (and thus `traceback`, snoop, etc.)
+    and any file registered with a module name can be imported by user code.
+    """
+
+    def __init__(self):
+        # filename -> source code
+        self.files: Dict[str, str] = {}
+        # module name -> filename
+        self.modules: Dict[str, str] = {}
+        self.packages = set()
+        # Incremented whenever an importable module changes, e.g. to invalidate anything made from it
+        self.version = 0
+
+    def add(self, filename: str, source_code: str, module_name: Optional[str] = None, is_package: bool = False):
+        """
+        Registers the source code of a file, replacing any previous version.
+        If `module_name` is given, the file can be imported with that name.
+        """
+        changed = self.files.get(filename) != source_code
+        self.files[filename] = source_code
+        if module_name:
+            self.modules[module_name] = filename
+            if is_package:
+                self.packages.add(module_name)
+            if changed and module_name != "__main__":
+                # Make the next import use the new source code
+                sys.modules.pop(module_name, None)
+                self.version += 1
+                self.install()
+
+        entry = linecache.cache.get(filename)
+        if changed or not entry or len(entry) != 1 and entry[1] is not None:
+            if os.path.exists(filename):
+                # linecache prefers a real file over a lazy entry, so give it the lines now
+                linecache.cache[filename] = (
+                    len(source_code),
+                    None,
+                    [line + "\n" for line in source_code.splitlines()],
+                    filename,
+                )
+            else:
+                linecache.cache[filename] = (functools.partial(self.files.get, filename),)
+
+    def add_module(self, module_name: str, source_code: str, filename: Optional[str] = None, is_package: bool = False):
+        """
+        Registers an importable user module, by default with a filename in the current directory.
+        """
+        if filename is None:
+            path = module_name.replace(".", os.sep)
+            filename = os.path.join(path, "__init__.py") if is_package else path + ".py"
+        filename = os.path.normcase(os.path.abspath(filename))
+        self.add(filename, source_code, module_name=module_name, is_package=is_package)
+        return filename
+
+    def remove(self, filename: str):
+        self.files.pop(filename, None)
+        for name, module_filename in list(self.modules.items()):
+            if module_filename == filename:
+                del self.modules[name]
+                self.packages.discard(name)
+                sys.modules.pop(name, None)
+                self.version += 1
+        linecache.cache.pop(filename, None)
+
+    def install(self):
+        """
+        Adds this registry to `sys.meta_path` (if it isn't there already) so that modules can be imported.
+        """
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def find_spec(self, fullname, path=None, target=None):
+        filename = self.modules.get(fullname)
+        if filename is None or fullname == "__main__" or filename not in self.files:
+            return None
+        is_package = fullname in self.packages
+        spec = importlib.util.spec_from_loader(fullname, self, origin=filename, is_package=is_package)
+        spec.has_location = True
+        if is_package:
+            spec.submodule_search_locations = [os.path.dirname(filename)]
+        return spec
+
+    def create_module(self, spec):
+        return None  # Use the default module creation
+
+    def exec_module(self, module: ModuleType):
+        filename = self.modules[module.__name__]
+        module.__file__ = filename
+        code_obj = compile(self.files[filename], filename, "exec", dont_inherit=True)
+        exec(code_obj, module.__dict__)
+
+    def get_source(self, fullname: str) -> Optional[str]:
+        """
+        Returns the source code for a module name or a filename, as used by linecache's lazy loading.
+        """
+        return self.files.get(self.modules.get(fullname, fullname))
+
+
+registry = SourceRegistry()
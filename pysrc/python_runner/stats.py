@@ -0,0 +1,102 @@
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+
+class RunStats:
+    """
+    Timings (in seconds) and counts for one run, sent as a 'run_stats' callback event
+    at the end of the run unless `Runner.collect_stats` is False.
+    The time spent in callbacks (e.g. blocked in 'sleep' and 'input') is measured separately,
+    to tell slow user code apart from a slow callback. 'output' events are only counted, not timed.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.start = perf_counter()
+        self.compile_time = 0.0
+        self.exec_time = 0.0
+        self.first_output_time: Optional[float] = None
+        self.callbacks: Counter = Counter()
+        self.callback_times: Dict[str, float] = defaultdict(float)
+        self.output_bytes = 0
+        # Kept apart from `callbacks` as the cheapest thing to count for every print()
+        self.output_callbacks = 0
+        self.peak_memory: Optional[int] = None
+
+        # Only stop tracemalloc at the end if it was started here
+        self._stop_tracing = False
+        if trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._stop_tracing = True
+        self._trace_memory = trace_memory
+
+    @contextmanager
+    def timed(self, attribute: str):
+        """
+        Adds the time taken inside this context manager to the given attribute, e.g. 'exec_time'.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, attribute, getattr(self, attribute) + perf_counter() - start)
+
+    def add_callback(self, event_type: str, duration: float):
+        """
+        Counts a callback event (other than 'output') which took `duration` seconds.
+        """
+        self.callbacks[event_type] += 1
+        self.callback_times[event_type] += duration
+
+    def add_output(self, parts: List[Dict[str, Any]]):
+        """
+        Counts an 'output' callback event with the given parts. These aren't timed,
+        since there can be one for every print() and timing them would slow printing down.
+        """
+        if not self.output_callbacks:
+            self.first_output_time = perf_counter() - self.start
+        self.output_callbacks += 1
+        output_bytes = 0
+        for part in parts:
+            text = part.get("text")
+            if text:
+                # Avoid encoding ASCII text just to count it
+                output_bytes += len(text) if text.isascii() else len(text.encode("utf8", "replace"))
+            if "bytes" in part:
+                # Parts pointing to output elsewhere (e.g. 'output_ring') may say how many bytes that was
+                output_bytes += part["bytes"]
+        self.output_bytes += output_bytes
+
+    def finish(self):
+        if self._trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if self._stop_tracing:
+                tracemalloc.stop()
+            self._trace_memory = False
+
+    def serialize(self) -> dict:
+        """
+        Returns the data of the 'run_stats' event.
+        `first_output_time` is the time from the start of the run until output was first passed to the callback,
+        or None if there was no output. `peak_memory` is in bytes, and None unless `Runner.trace_memory` is True.
+        """
+        callbacks = dict(self.callbacks)
+        if self.output_callbacks:
+            callbacks["output"] = self.output_callbacks
+        return dict(
+            total_time=perf_counter() - self.start,
+            compile_time=self.compile_time,
+            exec_time=self.exec_time,
+            first_output_time=self.first_output_time,
+            callbacks=callbacks,
+            callback_times=dict(self.callback_times),
+            sleep_time=self.callback_times.get("sleep", 0.0),
+            input_time=self.callback_times.get("input", 0.0),
+            output_bytes=self.output_bytes,
+            peak_memory=self.peak_memory,
+        )
@@ -0,0 +1,144 @@
+import builtins
+import traceback
+from types import TracebackType
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+CAUSE_MESSAGE = "\nThe above exception was the direct cause of the following exception:\n\n"
+CONTEXT_MESSAGE = "\nDuring handling of the above exception, another exception occurred:\n\n"
+
+BASE_EXCEPTION_GROUP = getattr(builtins, "BaseExceptionGroup", ())
+
+
+class CompactTraceback:
+    """
+    The entries of a traceback with consecutive repeats of the same frames (e.g. from deep recursion)
+    run-length encoded, and at most `max_frames` frames kept, split between the outermost and innermost.
+
+    Nothing is looked up or formatted until `frames` or `format` is called,
+    and then only for the frames that are kept, so this stays fast however deep the traceback was.
+    """
+
+    # The longest sequence of frames that's checked for repeats, e.g. 2 for mutual recursion between two functions
+    max_block_length = 8
+    # Blocks of frames which repeat fewer times than this in a row are kept as they are
+    min_repeats = 3
+
+    def __init__(self, tb: Optional[TracebackType], max_frames: int = 100):
+        entries = []
+        while tb:
+            entries.append(tb)
+            tb = tb.tb_next
+        self.total_frames = len(entries)
+        # (block of entries, number of times it ran in a row)
+        self.runs = self._encode(entries)
+        self.omitted = 0
+        # Index of the run before which `omitted` frames were dropped
+        self.omitted_at = len(self.runs)
+        if sum(len(block) for block, _ in self.runs) > max_frames:
+            self._cap(max_frames)
+
+    @property
+    def compacted(self) -> bool:
+        """
+        True if any frames were run-length encoded or omitted.
+        """
+        return bool(self.omitted) or any(count > 1 for _, count in self.runs)
+
+    def _encode(self, entries: List[TracebackType]) -> List[Tuple[List[TracebackType], int]]:
+        keys = [(entry.tb_frame.f_code, entry.tb_lasti) for entry in entries]
+        runs = []
+        i = 0
+        while i < len(keys):
+            best_length, best_count = 1, 1
+            for length in range(1, min(self.max_block_length, (len(keys) - i) // self.min_repeats) + 1):
+                block = keys[i:i + length]
+                count = 1
+                while keys[i + count * length:i + (count + 1) * length] == block:
+                    count += 1
+                # Prefer the shortest block covering the most frames
+                if count >= self.min_repeats and length * count > best_length * best_count:
+                    best_length, best_count = length, count
+            runs.append((entries[i:i + best_length], best_count))
+            i += best_length * best_count
+        return runs
+
+    def _cap(self, max_frames: int):
+        head_end = 0
+        shown = 0
+        while head_end < len(self.runs) and shown + len(self.runs[head_end][0]) <= max_frames // 2:
+            shown += len(self.runs[head_end][0])
+            head_end += 1
+        tail_start = len(self.runs)
+        while tail_start > head_end and shown + len(self.runs[tail_start - 1][0]) <= max_frames:
+            shown += len(self.runs[tail_start - 1][0])
+            tail_start -= 1
+        self.omitted = sum(len(block) * count for block, count in self.runs[head_end:tail_start])
+        self.runs = self.runs[:head_end] + self.runs[tail_start:]
+        self.omitted_at = head_end
+
+    def frames(self) -> List[Dict[str, Any]]:
+        """
+        Returns a dict with `filename`, `lineno` and `name` for each kept frame, outermost first.
+        The first frame of a block which ran several times in a row also has `repeat` (the number of times)
+        and `repeat_length` (the number of frames in the block), and the first frame after
+        any omitted frames has `omitted_before`.
+        """
+        result = []
+        for index, (block, count) in enumerate(self.runs):
+            for position, entry in enumerate(block):
+                code = entry.tb_frame.f_code
+                frame: Dict[str, Any] = dict(filename=code.co_filename, lineno=entry.tb_lineno, name=code.co_name)
+                if position == 0:
+                    if count > 1:
+                        frame.update(repeat=count, repeat_length=len(block))
+                    if self.omitted and index == self.omitted_at:
+                        frame["omitted_before"] = self.omitted
+                result.append(frame)
+        return result
+
+    def format(self) -> str:
+        """
+        Formats the kept frames like traceback.format_tb, with notes for repeated and omitted frames.
+        """
+        lines = []
+        for index, (block, count) in enumerate(self.runs):
+            if self.omitted and index == self.omitted_at:
+                lines.append(f"  [... {self.omitted} frames omitted ...]\n")
+            for entry in block:
+                # Formatting a single entry at a time only reads the source lines that are shown
+                lines.extend(traceback.format_tb(TracebackType(None, entry.tb_frame, entry.tb_lasti, entry.tb_lineno)))
+            if count > 1:
+                what = "line" if len(block) == 1 else f"{len(block)} frames"
+                lines.append(f"  [Previous {what} repeated {count - 1} more time{'s' if count > 2 else ''}]\n")
+        if self.omitted and self.omitted_at == len(self.runs):
+            lines.append(f"  [... {self.omitted} frames omitted ...]\n")
+        return "".join(lines)
+
+
+def format_exception(
+    exc: BaseException,
+    tb: Optional[TracebackType],
+    max_frames: int = 100,
+    _seen: Optional[Set[int]] = None,
+) -> str:
+    """
+    Like "".join(traceback.format_exception(...)), but tracebacks with repeated or too many frames
+    are formatted with CompactTraceback, including those of chained exceptions.
+    Single exceptions with ordinary tracebacks are formatted exactly as by the traceback module.
+    """
+    compact = CompactTraceback(tb, max_frames)
+    cause = exc.__cause__
+    context = None if exc.__suppress_context__ else exc.__context__
+    if isinstance(exc, BASE_EXCEPTION_GROUP) or not (compact.compacted or cause is not None or context is not None):
+        return "".join(traceback.format_exception(type(exc), exc, tb))
+
+    seen = _seen if _seen is not None else set()
+    seen.add(id(exc))
+    text = ""
+    if cause is not None and id(cause) not in seen:
+        text = format_exception(cause, cause.__traceback__, max_frames, seen) + CAUSE_MESSAGE
+    elif context is not None and id(context) not in seen:
+        text = format_exception(context, context.__traceback__, max_frames, seen) + CONTEXT_MESSAGE
+    if compact.total_frames:
+        text += "Traceback (most recent call last):\n" + compact.format()
+    return text + "".join(traceback.format_exception_only(type(exc), exc))
@@ -250,18 +250,23 @@ sys.path.append("${libDir}")
         
         
         const runner = pyodide.runPython(`from python_runner import PyodideRunner
-import traceback
-from itertools import dropwhile
+from python_runner.tracebacks import CompactTraceback
 class StrypePyodideRunner(PyodideRunner):
     def serialize_traceback(self, exc):
         # exc is BaseException and we should return a dict.
-        tbe = traceback.TracebackException.from_exception(exc)
-        # Get rid of python_runner frames (like skip_traceback_internals does),
-        # and translate to dict for easy transformation into Javascript object:
-        filtered = [dict(filename=frame.filename, lineno=frame.lineno) for frame in list(dropwhile(lambda f: f.filename != self.filename, tbe.stack))]
+        # Get rid of python_runner frames (like skip_traceback_internals does):
+        tb = exc.__traceback__
+        while tb and tb.tb_frame.f_code.co_filename != self.filename:
+            tb = tb.tb_next
+        # Translate to dicts for easy transformation into Javascript objects.  Repeated frames
+        # (e.g. from a RecursionError) are only sent once, with a "repeat" count on the first:
+        filtered = CompactTraceback(tb, self.traceback_max_frames).frames()
         return dict(error_type=type(exc).__name__, error_message=str(exc), traceback=filtered, text=type(exc).__name__ + ": " + str(exc))
     def reset(self):
         super().reset()
+        if self.warm_started:
+            # The names are already in the namespace restored from the warm start snapshot
+            return
         # The dict we need to add the names to:
         target = self.console.locals
         # Effectively does: from strype.builtins import *
@@ -498,8 +503,9 @@ runner`);
             else if (type === "output") {
                 const outputText = data.parts as OutputPart[];
                 // We print out "stdout", "stderr" and "input_prompt", but not "input" because that has already been added to the console
-                // when the user entered it there in the HTML input element.
-                const stdoutParts = outputText.filter((t) => t.type == "stdout" || t.type == "stderr" || t.type == "input_prompt");
+                // when the user entered it there in the HTML input element.  "truncated" says how much output was dropped
+                // if there is a limit on the amount of output.
+                const stdoutParts = outputText.filter((t) => t.type == "stdout" || t.type == "stderr" || t.type == "input_prompt" || t.type == "truncated");
                 if (stdoutParts.length > 0) {
                     asyncBridge({request: "console_print", text: stdoutParts.map((t) => t.text).join(""), containsInputPrompt: outputText.some((t) => t.type == "input_prompt")});
                 }
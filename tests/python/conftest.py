@@ -0,0 +1,5 @@
+import os
+import sys
+
+# python_runner is bundled from pysrc rather than installed
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "pysrc"))
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from python_runner.runner import AsyncPyodideRunner
+
+
+def test_overlapping_runs_are_refused():
+    parts = []
+
+    def callback(event_type, data):
+        parts.extend(data.get("parts", []))
+
+    async def main():
+        first = AsyncPyodideRunner(callback=callback)
+        second = AsyncPyodideRunner(callback=callback)
+        task = asyncio.ensure_future(first.run_async("import asyncio\nawait asyncio.sleep(0.01)\nprint('done')"))
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError, match="Another run is still in progress"):
+            await second.run_async("print('second')")
+        await task
+        await second.run_async("print('second')")
+
+    asyncio.run(main())
+    assert [part["text"] for part in parts if part["type"] == "stdout"] == ["done", "\n", "second", "\n"]
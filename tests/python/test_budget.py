@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from python_runner import Runner
+from python_runner import budget as budget_module
+from python_runner.budget import ExecutionBudget
+
+# Each iteration takes a few milliseconds in C code, rather than sleeping since runners may patch time.sleep
+SLOW_LOOP = "while True:\n    sum(range(10 ** 5))\n"
+
+
+@pytest.fixture(params=["monitor", "trace"])
+def path(request, monkeypatch):
+    if request.param == "monitor":
+        if not budget_module.MONITORING:
+            pytest.skip("sys.monitoring isn't available")
+    else:
+        monkeypatch.setattr(budget_module, "MONITORING", False)
+    return request.param
+
+
+def run(source_code, budget):
+    parts = []
+    runner = Runner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    start = time.perf_counter()
+    runner.run(source_code, budget=budget)
+    tracebacks = [part["text"] for part in parts if part["type"] == "traceback"]
+    return tracebacks, time.perf_counter() - start
+
+
+@pytest.mark.parametrize("source_code", ["while True: pass", "i = 0\nwhile True:\n    i += 1\n"])
+def test_step_limit(path, source_code):
+    budget = ExecutionBudget(max_steps=1000)
+    tracebacks, _ = run(source_code, budget)
+    assert len(tracebacks) == 1
+    assert "BudgetExceeded: Program ran more than 1000 steps of code" in tracebacks[0]
+    assert budget.steps == 1001
+
+
+def test_step_limit_counts_calls(path):
+    budget = ExecutionBudget(max_steps=100)
+    tracebacks, _ = run("def f(n):\n    return f(n + 1)\nf(0)\n", budget)
+    assert "BudgetExceeded" in tracebacks[0]
+
+
+def test_no_error_within_the_limits(path):
+    budget = ExecutionBudget(max_steps=1000, time_limit=10)
+    tracebacks, _ = run("for i in range(100):\n    pass\n", budget)
+    assert tracebacks == []
+
+
+@pytest.mark.parametrize("source_code", [
+    "while True: pass",
+    "i = 0\nwhile True:\n    i += 1\n",
+    # Slow steps make the clock be checked more often
+    SLOW_LOOP,
+])
+def test_time_limit(path, source_code):
+    budget = ExecutionBudget(time_limit=0.2)
+    tracebacks, elapsed = run(source_code, budget)
+    assert "BudgetExceeded: Program ran for longer than 0.2 seconds" in tracebacks[0]
+    assert 0.2 <= elapsed < 1
+
+
+def test_check_interval_adapts():
+    budget = ExecutionBudget(time_limit=10)
+    budget.deadline = 100.0
+    budget._last_check = (0, 0.0)
+    budget._check_interval = 1000
+
+    # A million steps per second, so 10000 steps per check_period, but the interval at most doubles
+    budget.steps = 1000
+    budget._adapt_interval(0.001)
+    assert budget._check_interval == 2000
+
+    # Then slow steps
+    budget.steps = 1010
+    budget._adapt_interval(1.001)
+    assert budget._check_interval == 1
+
+    # Close to the deadline, the next check is at the deadline
+    budget.deadline = 1.002
+    budget.steps = 1020
+    budget._adapt_interval(1.0011)
+    assert budget._check_interval == 2
@@ -0,0 +1,89 @@
+from python_runner import Runner
+
+
+def run_incremental(runner, source_code, parts):
+    parts.clear()
+    runner.run(source_code, mode="incremental")
+    return "".join(part["text"] for part in parts if part["type"] == "stdout")
+
+
+def test_rerun_after_editing_a_mutation_matches_a_fresh_run():
+    parts = []
+    runner = Runner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    assert run_incremental(runner, "data = [1, 2]\ndata.append(3)\nprint(data)\n", parts) == "[1, 2, 3]\n"
+
+    assert run_incremental(runner, "data = [1, 2]\ndata.append(4)\nprint(data)\n", parts) == "[1, 2, 4]\n"
+    assert runner.console.locals["data"] == [1, 2, 4]
+
+
+def test_attribute_and_subscript_assignments_rerun_the_definition():
+    parts = []
+    runner = Runner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    source = "d = {}\nd['k'] = 1\nx = 0\nprint(sorted(d))\n"
+    assert run_incremental(runner, source, parts) == "['k']\n"
+
+    assert run_incremental(runner, source.replace("d['k']", "d['j']"), parts) == "['j']\n"
+    assert [s.lineno for s in runner.incremental_plan.rerun] == [1, 2, 4]
+
+
+def test_function_mutating_a_global_reruns_the_definition():
+    parts = []
+    runner = Runner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    source = "data = []\ndef add(x):\n    data.append(x)\nadd(1)\nprint(data)\n"
+    assert run_incremental(runner, source, parts) == "[1]\n"
+
+    assert run_incremental(runner, source.replace("add(1)", "add(2)"), parts) == "[2]\n"
+
+
+def test_calling_module_functions_does_not_rerun_other_statements():
+    parts = []
+    runner = Runner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    source = "import math\nprint(math.sqrt(4))\nprint(math.sqrt(9))\n"
+    run_incremental(runner, source, parts)
+
+    assert run_incremental(runner, source.replace("sqrt(9)", "sqrt(16)"), parts) == "4.0\n"
+    assert [s.lineno for s in runner.incremental_plan.rerun] == [3]
+
+
+def assert_same_as_fresh_run(source, new_source):
+    parts = []
+    runner = Runner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    run_incremental(runner, source, parts)
+    output = run_incremental(runner, new_source, parts)
+
+    fresh_parts = []
+    fresh = Runner(callback=lambda event_type, data: fresh_parts.extend(data.get("parts", [])))
+    assert output == run_incremental(fresh, new_source, fresh_parts)
+    return runner
+
+
+def test_module_function_changing_an_argument():
+    source = "import random\nrandom.seed(0)\ndeck = [1, 2, 3, 4]\nhand = deck[:2]\nprint(deck, hand)\n"
+    new_source = source.replace("hand =", "random.shuffle(deck)\nhand =")
+    runner = assert_same_as_fresh_run(source, new_source)
+    assert runner.console.locals["hand"] == runner.console.locals["deck"][:2]
+
+
+def test_user_function_changing_an_argument():
+    source = "def add(items, x):\n    items.append(x)\ndata = [1]\nadd(data, 2)\nprint(data)\n"
+    assert_same_as_fresh_run(source, source.replace("add(data, 2)", "add(data, 3)"))
+
+
+def test_changing_an_alias():
+    source = "a = [1]\nb = a\nb.append(2)\nprint(a)\n"
+    assert_same_as_fresh_run(source, source.replace("append(2)", "append(3)"))
+
+
+def test_setattr():
+    source = "class C:\n    x = 0\nobj = C()\nsetattr(obj, 'x', 1)\nprint(obj.x)\n"
+    assert_same_as_fresh_run(source, source.replace("'x', 1", "'x', 2"))
+
+
+def test_print_does_not_rerun_its_arguments():
+    parts = []
+    runner = Runner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    source = "data = [1]\nprint(data)\nprint(len(data))\n"
+    run_incremental(runner, source, parts)
+
+    assert run_incremental(runner, source.replace("print(data)", "print('data', data)"), parts) == "data [1]\n"
+    assert [s.lineno for s in runner.incremental_plan.rerun] == [2]
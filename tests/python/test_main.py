@@ -0,0 +1,33 @@
+import json
+
+from python_runner.__main__ import main
+
+
+def run_main(tmp_path, capsys, filename, source_code, inputs):
+    program = tmp_path / filename
+    program.write_text(source_code)
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(inputs)
+    exit_code = main([str(program), "--input", str(input_file)])
+    return exit_code, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_spy_file_with_strype_builtins(tmp_path, capsys):
+    exit_code, parts = run_main(tmp_path, capsys, "hello.spy", "clear_console()\nprint(input('Name? '))\n", "Ada\n")
+    assert exit_code == 0
+    assert [part["type"] for part in parts] == ["input_prompt", "input", "stdout", "stdout", "exit"]
+    assert parts[2]["text"] == "Ada"
+
+
+def test_spy_file_using_graphics(tmp_path, capsys):
+    exit_code, parts = run_main(tmp_path, capsys, "game.spy", "from strype.graphics import *\n", "")
+    assert exit_code == 1
+    assert "only available in Strype in the browser" in parts[-2]["text"]
+
+
+def test_eof_traceback_has_no_internal_frames(tmp_path, capsys):
+    exit_code, parts = run_main(tmp_path, capsys, "ask.py", "input()\ninput()\n", "one\n")
+    traceback = parts[-2]
+    assert exit_code == 1
+    assert traceback["error_type"] == "EOFError"
+    assert traceback["text"].count('File "') == 1
@@ -0,0 +1,63 @@
+from python_runner.output import OutputBuffer
+
+
+def make_buffer(**limits):
+    flushed = []
+    buffer = OutputBuffer(flushed.extend)
+    for name, value in limits.items():
+        setattr(buffer, name, value)
+    return buffer, flushed
+
+
+def test_truncated_once_with_input_prompts():
+    buffer, flushed = make_buffer(max_output_lines=3, tail_length=8)
+    for i in range(100):
+        buffer.put("input_prompt", "> ")
+        buffer.put("stdout", f"line {i}\n")
+    buffer.finish_run()
+
+    truncated = [part for part in flushed if part["type"] == "truncated"]
+    assert len(truncated) == 1
+    assert truncated[0]["dropped_lines"] == 97 - 1
+    assert [part["type"] for part in flushed].count("input_prompt") == 100
+    assert flushed[-2:] == [truncated[0], dict(type="stdout", text="line 99\n")]
+
+
+def test_tail_before_traceback():
+    buffer, flushed = make_buffer(max_output_chars=5, tail_length=3)
+    buffer.put("stdout", "abcdefghij")
+    buffer.put("traceback", "Error")
+    buffer.finish_run()
+
+    assert [part["type"] for part in flushed] == ["stdout", "truncated", "stdout", "traceback"]
+    assert flushed[1]["dropped_chars"] == 2
+    assert flushed[2]["text"] == "hij"
+
+
+def test_no_truncated_part_when_the_tail_holds_everything():
+    buffer, flushed = make_buffer(max_output_chars=5, tail_length=3)
+    buffer.put("stdout", "abcdefgh")
+    buffer.finish_run()
+
+    assert [part["type"] for part in flushed] == ["stdout", "stdout"]
+    assert "".join(part["text"] for part in flushed) == "abcdefgh"
+
+
+def test_stdout_flush_is_a_barrier_with_coalescing(monkeypatch):
+    from python_runner import Runner
+    from python_runner.output import CoalescingFlushPolicy
+
+    class CoalescingBuffer(OutputBuffer):
+        flush_policy = CoalescingFlushPolicy()
+
+    class CoalescingRunner(Runner):
+        OutputBufferClass = CoalescingBuffer
+
+    events = []
+    runner = CoalescingRunner(callback=lambda event_type, data: events.append(
+        [part["text"] for part in data.get("parts", [])]
+    ))
+    # Stands in for a graphics call made through a bridge rather than a callback
+    monkeypatch.setattr("builtins.draw", lambda: events.append("draw"), raising=False)
+    runner.run("import sys\nprint('a')\nprint('b')\nsys.stdout.flush()\ndraw()\nprint('c')")
+    assert events[events.index("draw") - 1] == ["a\nb\n"]
@@ -0,0 +1,30 @@
+import pytest
+
+from python_runner import Runner
+from python_runner.runner import CodeCache
+
+
+class WarmRunner(Runner):
+    warm_start = True
+
+
+@pytest.mark.parametrize("runner_class", [Runner, WarmRunner])
+@pytest.mark.parametrize("mode", ["exec", "single", "eval", "incremental"])
+def test_run_after_precompile_is_cached(runner_class, mode, monkeypatch):
+    monkeypatch.setattr(Runner, "code_cache", CodeCache())
+    source_code = {"single": "x = 1", "eval": "1 + 2"}.get(mode, "import math\nmath.sqrt(4)")
+    runner = runner_class(callback=lambda event_type, data: None)
+    assert runner.precompile(source_code, mode) is None
+    compiled = len(runner.code_cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("compiled again")
+
+    monkeypatch.setattr("python_runner.runner.compile", fail, raising=False)
+    runner.pre_run(source_code, mode)
+    assert len(runner.code_cache) == compiled
+
+
+def test_precompile_syntax_error():
+    runner = Runner(callback=lambda event_type, data: None)
+    assert "SyntaxError" in runner.precompile("x = (")["text"]
@@ -0,0 +1,96 @@
+from python_runner.ringbuffer import POSITION_MASK, OutputRing, RingOutputBuffer, RingReader
+
+
+def make_buffer(capacity=64, read_on_flush=True, ring=None, cls=RingOutputBuffer):
+    """
+    Returns a RingOutputBuffer and the list of parts it outputs,
+    with the ring read whenever an 'output_ring' part is flushed unless `read_on_flush` is False.
+    """
+    ring = ring or OutputRing(capacity=capacity)
+    reader = RingReader(ring)
+    parts = []
+
+    def flush(flushed):
+        for part in flushed:
+            if part["type"] == "output_ring":
+                if read_on_flush:
+                    parts.extend(reader.read())
+            else:
+                parts.append(part)
+
+    buffer = cls(flush, ring=ring)
+    return buffer, parts, reader
+
+
+def joined(parts, output_type="stdout"):
+    return "".join(part["text"] for part in parts if part["type"] == output_type)
+
+
+def test_text_and_json_parts_keep_their_order():
+    buffer, parts, _ = make_buffer()
+    buffer.put("stdout", "a")
+    buffer.put("input_prompt", "? ")
+    buffer.put("stderr", "b")
+    buffer.put("traceback", "Error", error_type="ValueError")
+    assert parts == [
+        dict(type="stdout", text="a"),
+        dict(type="input_prompt", text="? "),
+        dict(type="stderr", text="b"),
+        dict(type="traceback", text="Error", error_type="ValueError"),
+    ]
+
+
+def test_frames_wrap_around_the_end_of_the_ring():
+    buffer, parts, _ = make_buffer(capacity=32)
+    expected = ""
+    for i in range(50):
+        text = f"line {i}\n"
+        buffer.put("stdout", text)
+        buffer.put("input_prompt", str(i))
+        expected += text
+    assert joined(parts) == expected
+    assert [part["text"] for part in parts if part["type"] == "input_prompt"] == [str(i) for i in range(50)]
+
+
+def test_long_text_is_split_without_splitting_utf8():
+    buffer, parts, _ = make_buffer(capacity=16)
+    text = "é€😀" * 20
+    buffer.put("stdout", text)
+    assert joined(parts) == text
+    assert len(parts) > 1
+
+
+def test_positions_wrap_around_uint32():
+    ring = OutputRing(capacity=32)
+    ring.write_position = ring.read_position = POSITION_MASK - 20
+    buffer, parts, _ = make_buffer(ring=ring)
+    for i in range(10):
+        buffer.put("stdout", f"{i}abcdef")
+    assert joined(parts) == "".join(f"{i}abcdef" for i in range(10))
+    assert ring.write_position < 100
+
+
+def test_output_goes_to_the_callback_when_the_ring_is_full():
+    buffer, parts, reader = make_buffer(capacity=32, read_on_flush=False)
+    buffer.put("stdout", "x" * 20)
+    buffer.put("stdout", "y" * 20)
+    # The first write is still in the unread ring, so the second bypasses it
+    assert parts == [dict(type="stdout", text="y" * 20)]
+    assert reader.read() == [dict(type="stdout", text="x" * 20)]
+
+
+def test_wait_for_space():
+    readers = []
+
+    class WaitingBuffer(RingOutputBuffer):
+        def wait_for_space(self, length):
+            # Stands in for waiting until a JavaScript consumer reads the ring
+            parts.extend(readers[0].read())
+            return super().wait_for_space(length)
+
+    buffer, parts, reader = make_buffer(capacity=32, read_on_flush=False, cls=WaitingBuffer)
+    readers.append(reader)
+    buffer.put("stdout", "x" * 20)
+    buffer.put("stdout", "y" * 20)
+    assert parts == [dict(type="stdout", text="x" * 20)]
+    assert reader.read() == [dict(type="stdout", text="y" * 20)]
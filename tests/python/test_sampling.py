@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+
+import pytest
+
+from python_runner import Runner
+from python_runner import sampling as sampling_module
+from python_runner.sampling import StackSampler
+
+
+class EventSampler(StackSampler):
+    interval = 0.001
+
+    @contextmanager
+    def thread_sampling(self):
+        # As in Pyodide, where there are no threads
+        raise RuntimeError("no threads")
+        yield
+
+
+class EventSamplingRunner(Runner):
+    StackSamplerClass = EventSampler
+
+
+@pytest.fixture(params=["monitor", "trace"])
+def path(request, monkeypatch):
+    if request.param == "monitor":
+        if not sampling_module.MONITORING:
+            pytest.skip("sys.monitoring isn't available")
+    else:
+        monkeypatch.setattr(sampling_module, "MONITORING", False)
+    return request.param
+
+
+def test_event_sampling_samples_loops(path):
+    parts = []
+    runner = EventSamplingRunner(callback=lambda event_type, data: parts.extend(data.get("parts", [])))
+    runner.run("def f():\n    pass\nf()\nk = 0\nwhile k < 300000:\n    k += 1\n", mode="sample")
+    samples = [part for part in parts if part["type"] == "samples"][0]
+    assert samples["samples"] > 0
+    # The time is in the loop, not at the `def` line of the function called before it
+    top_stack = samples["text"].splitlines()[0]
+    assert top_stack.startswith(("<module> (my_program.py:5)", "<module> (my_program.py:6)"))
+    assert "f (my_program.py" not in samples["text"]
@@ -0,0 +1,50 @@
+import time
+
+from python_runner import Runner
+
+PRINT_LOOP = "for i in range(20000):\n    print(i)"
+
+
+def run(source_code, collect_stats=True):
+    events = []
+
+    class StatsRunner(Runner):
+        pass
+
+    StatsRunner.collect_stats = collect_stats
+    runner = StatsRunner(callback=lambda event_type, data: events.append((event_type, data)))
+    runner.run(source_code)
+    return events
+
+
+def test_run_stats_counts_output():
+    events = run("print('ab')\nprint('é')")
+    event_type, stats = events[-1]
+    assert event_type == "run_stats"
+    assert stats["callbacks"]["output"] == len([e for e in events if e[0] == "output"])
+    assert stats["output_bytes"] == len("ab\n") + len("é\n".encode("utf8"))
+    assert stats["first_output_time"] is not None
+
+
+def test_run_stats_no_output():
+    stats = run("x = 1")[-1][1]
+    assert stats["callbacks"] == {}
+    assert stats["first_output_time"] is None
+
+
+def best_times():
+    # Alternate between the two so that both are measured under the same conditions
+    best = {True: float("inf"), False: float("inf")}
+    for _ in range(7):
+        for collect_stats in best:
+            start = time.perf_counter()
+            run(PRINT_LOOP, collect_stats)
+            best[collect_stats] = min(best[collect_stats], time.perf_counter() - start)
+    return best
+
+
+def test_print_loop_overhead():
+    # Every print() is flushed in its own 'output' event by default,
+    # so collecting stats mustn't add much to each callback
+    best = best_times()
+    assert best[True] < best[False] * 1.5
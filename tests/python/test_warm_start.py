@@ -0,0 +1,27 @@
+from python_runner import Runner
+from python_runner.sources import SourceRegistry
+
+
+class WarmRunner(Runner):
+    warm_start = True
+    source_registry = SourceRegistry()
+
+
+def stdout(runner, source_code):
+    parts = []
+    runner.set_callback(lambda event_type, data: parts.extend(data["parts"]) if event_type == "output" else None)
+    runner.run(source_code)
+    return "".join(part["text"] for part in parts if part["type"] == "stdout")
+
+
+def test_changed_user_module_invalidates_snapshot():
+    runner = WarmRunner()
+    runner.source_registry.add_module("warm_start_module", "X = 1")
+    source = "from warm_start_module import X\nprint(X)"
+    assert stdout(runner, source) == "1\n"
+    assert stdout(runner, source) == "1\n"
+    assert runner.warm_started
+
+    runner.source_registry.add_module("warm_start_module", "X = 2")
+    assert stdout(runner, source) == "2\n"
+    assert not runner.warm_started